@@ -0,0 +1,190 @@
+'''
+Benchmarks of the hot paths of the simulation.
+
+Each benchmark is timed (best of a number of repeats) and its peak memory is measured with
+tracemalloc in one further run, over a grid of population sizes, numbers of rounds and
+backends. The results are written as JSON, and compared with a stored baseline, so that a
+benchmark that has become slower than its baseline by more than a tolerance is flagged as a
+regression.
+
+    python benchmark.py --output results.json --baseline baseline.json
+    python benchmark.py --quick --save-baseline baseline.json
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import engine
+import fig6
+from fig6 import Distribution, Population, Simulation, OBJECT_BACKEND
+
+
+# All available backends (see engine.register_backend)
+BACKENDS = engine.get_backend_names()
+SIZES = [4000, 40000, 400000, 4000000]
+N_STEPS = [100, 200, 1000]
+QUICK_SIZES = [4000, 40000]
+QUICK_N_STEPS = [200]
+
+# The benchmarks of the Group and Player objects are only run up to this population size
+MAX_OBJECT_SIZE = 40000
+
+# A benchmark is a regression if it takes more than (1 + TOLERANCE) times its baseline time,
+# and at least MIN_DIFFERENCE seconds longer (so that timer noise in very short benchmarks is
+# not flagged)
+TOLERANCE = 0.2
+MIN_DIFFERENCE = 0.001
+
+# The distribution of Figure 6 at the empirical proportion of unconditional cooperators
+DISTRIBUTION = Distribution(0.56, 0.44 / 11.2)
+
+
+def measure(function, repeat=3):
+    '''
+    Return the shortest time in seconds of repeat calls of function, and the peak memory in
+    bytes allocated during one further call (numpy allocations included).
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak_memory
+
+
+def _get_benchmarks(sizes, n_steps_list, backends):
+    '''
+    Yield (name, backend, size, n_steps, function) for each benchmark, with backend and
+    n_steps None where they do not apply.
+    '''
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        if size <= MAX_OBJECT_SIZE:
+            yield ("sample_group", None, size, None,
+                   lambda size=size: [DISTRIBUTION.sample_group() for _ in range(size // 4)])
+            population = Population(size, DISTRIBUTION, rng)
+            yield ("create_groups", None, size, None, population._create_groups)
+        yield ("sample_types", None, size, None, lambda size=size: Population(size, DISTRIBUTION, rng))
+
+        for n_steps in n_steps_list:
+            if size <= MAX_OBJECT_SIZE:
+                population = Population(size, DISTRIBUTION, rng)
+
+                def _run_groups(population=population, n_steps=n_steps):
+                    for group in population.groups:
+                        group.run(n_steps)
+                yield ("group_run", None, size, n_steps, _run_groups)
+
+            for backend in backends:
+                if backend == OBJECT_BACKEND and size > MAX_OBJECT_SIZE:
+                    continue
+                simulation = Simulation(size, DISTRIBUTION, backend, rng=rng)
+
+                def _run_simulation(simulation=simulation, n_steps=n_steps):
+                    simulation.run(n_steps)
+                    simulation.get_proportion_successful_groups()
+                yield ("simulation", backend, size, n_steps, _run_simulation)
+
+    ucs = [i / 20 for i in range(21)]
+    points = [(uc, (1 - uc) / 11.2) for uc in ucs]
+    for backend in backends:
+        if backend != OBJECT_BACKEND:
+            yield ("vary_only_uc_sweep", backend, 4000, 200,
+                   lambda backend=backend: fig6.sweep(points, 4000, 200, 0, 1, backend=backend))
+
+
+def run_benchmarks(sizes=SIZES, n_steps_list=N_STEPS, backends=BACKENDS, repeat=3):
+    '''Run the benchmarks and return a list of results, one dict per benchmark.'''
+    results = []
+    for name, backend, size, n_steps, function in _get_benchmarks(sizes, n_steps_list, backends):
+        seconds, peak_memory = measure(function, repeat)
+        result = {"name": name, "backend": backend, "size": size, "n_steps": n_steps,
+                  "seconds": seconds, "peak_memory": peak_memory}
+        if n_steps is not None and name != "vary_only_uc_sweep":
+            result["agent_rounds_per_second"] = size * n_steps / seconds
+        results.append(result)
+        print(format_result(result), flush=True)
+    return results
+
+
+def _get_key(result):
+    return (result["name"], result["backend"], result["size"], result["n_steps"])
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    Add the baseline time and the ratio to it to each result that has a baseline, and flag it
+    as a regression if the ratio exceeds 1 + tolerance (see TOLERANCE). Return the regressed
+    results.
+    '''
+    baseline_seconds = {_get_key(result): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        seconds = baseline_seconds.get(_get_key(result))
+        if seconds is None:
+            continue
+        result["baseline_seconds"] = seconds
+        result["ratio"] = result["seconds"] / seconds
+        result["regression"] = (result["ratio"] > 1 + tolerance
+                                and result["seconds"] - seconds >= MIN_DIFFERENCE)
+        if result["regression"]:
+            regressions.append(result)
+    return regressions
+
+
+def format_result(result):
+    '''Return a one-line description of a result.'''
+    s = f"{result['name']:<20} {str(result['backend']):<12} size={result['size']:<9} "
+    s += f"n_steps={str(result['n_steps']):<5} {result['seconds']:10.4f}s {result['peak_memory'] / 2**20:9.1f}MiB"
+    if "ratio" in result:
+        s += f"  x{result['ratio']:.2f}" + (" REGRESSION" if result["regression"] else "")
+    return s
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the simulation.")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline to this file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--quick", action="store_true", help="only run the smaller sizes")
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--n-steps", type=int, nargs="+")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    n_steps_list = args.n_steps or (QUICK_N_STEPS if args.quick else N_STEPS)
+    results = run_benchmarks(sizes, n_steps_list, args.backends, args.repeat)
+    report = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+              "cpu_count": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for result in regressions:
+            print(format_result(result))
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
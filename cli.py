@@ -0,0 +1,187 @@
+'''
+Command-line interface for batch runs without a display.
+
+    python cli.py sweep --seed 0 --output sweep.csv --plot fig6.png
+    python cli.py contour --seed 0 --adaptive --output contour.json --plot contour.png
+    python cli.py thresholds --seed 0 --output thresholds.csv --plot thresholds.png
+    python cli.py trajectory --uc 0.56 --output trajectories.npy --plot trajectories.png
+    python cli.py export --from-data --output coefficients.csv
+    python cli.py check-backends --configurations 50
+
+Results are written as CSV or JSON (chosen by the file extension of --output) and figures as
+PNG (or any format matplotlib infers from the extension of --plot). matplotlib is only imported
+when --plot is given, and then with the non-interactive Agg backend, so a run that only writes
+numbers does not pay for importing it.
+'''
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+import engine
+import fig6
+import instrument
+import store
+import trajectory
+
+
+def write_table(path, header, rows):
+    '''Write rows (sequences of values in the order of header) as CSV, or as JSON if path ends in .json.'''
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, 'w') as f:
+            json.dump([dict(zip(header, row)) for row in rows], f, indent=1)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+
+def _get_result_store(args):
+    return None if args.store is None else store.ResultStore(args.store)
+
+
+def run_sweep(args):
+    profile = args.profiles[0] if len(args.profiles) == 1 else args.profiles
+    ucs, ps = fig6.get_only_uc_curve(args.seed, args.workers, _get_result_store(args), args.replicates, profile,
+                                     args.bootstrap)
+    profiles = args.profiles
+    if args.output is not None:
+        rows = [(uc, fig6.compute_fr(uc), p, k, value)
+                for i, uc in enumerate(ucs) for j, p in enumerate(profiles) for k, value in enumerate(ps[i, j])]
+        write_table(args.output, ["uc", "fr", "profile", "sample", "p"], rows)
+    if args.plot is not None:
+        fig6.plot_only_uc(ucs, ps, profiles, args.plot)
+
+
+def run_contour(args):
+    UC, FR, Z = fig6.get_uc_fr_grid(args.seed, args.workers, _get_result_store(args), args.adaptive)
+    if args.output is not None:
+        valid = UC + FR <= 1
+        write_table(args.output, ["uc", "fr", "p"], zip(UC[valid].tolist(), FR[valid].tolist(), Z[valid].tolist()))
+    if args.plot is not None:
+        fig6.plot_uc_fr(UC, FR, Z, args.plot)
+
+
+def run_thresholds(args):
+    UC, T, Z = fig6.get_threshold_uc_grid(args.seed, args.workers, _get_result_store(args), args.thresholds)
+    if args.output is not None:
+        write_table(args.output, ["uc", "threshold", "p"], zip(UC.ravel().tolist(), T.ravel().tolist(),
+                                                               Z.ravel().tolist()))
+    if args.plot is not None:
+        fig6.plot_threshold_uc(UC, T, Z, args.plot)
+
+
+def run_trajectory(args):
+    rng = np.random.default_rng(args.seed)
+    fr = fig6.compute_fr(args.uc) if args.fr is None else args.fr
+    simulation = fig6.Simulation(args.size, fig6.Distribution(args.uc, fr), rng=rng, treatment=args.treatment)
+    recorder = trajectory.TrajectoryRecorder(args.output, args.size // 4, args.n_steps, args.stride,
+                                             args.per_player, args.dtype)
+    simulation.run(args.n_steps, recorder=recorder)
+    recorder.close()
+    print(simulation.get_proportion_successful_groups())
+    if args.plot is not None:
+        trajectories, rounds, scale = trajectory.load_trajectories(args.output)
+        group_contributions = np.asarray(trajectories, dtype=float) / scale
+        if args.per_player:
+            group_contributions = group_contributions.sum(axis=-1)
+        plt = fig6.get_pyplot(args.plot)
+        plt.plot(rounds, group_contributions[:args.n_plotted].T, color='k', alpha=0.2, linewidth=0.5)
+        plt.plot(rounds, group_contributions.mean(axis=0), color='r', label="Mean")
+        plt.axhline(fig6.THRESHOLD, color='b', linestyle='--')
+        plt.legend()
+        plt.xlabel("Round")
+        plt.ylabel("Group contribution")
+        fig6.show_figure(plt, args.plot)
+
+
+def run_export(args):
+    if args.from_data:
+        import lcp
+        tables, _ = lcp.run_pipeline()
+        matrix = lcp.get_coefficient_matrix(tables)
+    else:
+        matrix = fig6.get_coefficient_matrix()
+    rows = [(profile, player_type, *matrix[i, j, [engine.INTERCEPT, engine.SLOPE, engine.CONTR1]].tolist())
+            for i, profile in enumerate(fig6.PROFILES) for j, player_type in enumerate(fig6.PLAYER_TYPES)]
+    write_table(args.output, ["profile", "type", "intercept", "slope", "contr1"], rows)
+
+
+def run_check_backends(args):
+    results = fig6.check_backends(args.configurations, args.seed, args.backends)
+    for uc, fr, size, n_steps, proportions in results:
+        print(f"uc={uc:.3f} fr={fr:.3f} size={size} n_steps={n_steps} p={next(iter(proportions.values())):.4f}")
+    print(f"{len(results)} configurations agree on backends {', '.join(results[0][4])}")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Run the simulation without a display.")
+    parser.add_argument("--report", help="write an instrumentation report (see instrument.py) as JSON to this file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sweep = subparsers.add_parser("sweep", help="vary UC with CC/FR constant (Figure 6)")
+    sweep.add_argument("--profiles", nargs="+", choices=fig6.PROFILES, default=[fig6.AVERAGE])
+    sweep.add_argument("--replicates", type=int)
+    sweep.add_argument("--bootstrap", type=int, help="number of bootstrap samples of the data")
+    sweep.set_defaults(function=run_sweep)
+
+    contour = subparsers.add_parser("contour", help="vary UC and FR on a grid")
+    contour.add_argument("--adaptive", action="store_true", help="refine the grid around the contour levels")
+    contour.set_defaults(function=run_contour)
+
+    thresholds = subparsers.add_parser("thresholds", help="vary UC and the success threshold (heatmap)")
+    thresholds.add_argument("--thresholds", type=float, nargs="+", default=fig6.THRESHOLDS.tolist())
+    thresholds.set_defaults(function=run_thresholds)
+
+    for subparser in (sweep, contour, thresholds):
+        subparser.add_argument("--seed", type=int, default=0)
+        subparser.add_argument("--workers", type=int, help="number of processes (all CPUs if not given)")
+        subparser.add_argument("--store", help="SQLite file of stored results (see store.py)")
+        subparser.add_argument("--output", help="CSV or JSON file for the results")
+        subparser.add_argument("--plot", help="image file for the figure")
+
+    trajectories = subparsers.add_parser("trajectory", help="record the contributions in every round")
+    trajectories.add_argument("--uc", type=float, default=0.56)
+    trajectories.add_argument("--fr", type=float, help="proportion FR (CC/FR as in Figure 6 if not given)")
+    trajectories.add_argument("--size", type=int, default=4000)
+    trajectories.add_argument("--n-steps", type=int, default=200)
+    trajectories.add_argument("--treatment", choices=fig6.TREATMENTS)
+    trajectories.add_argument("--stride", type=int, default=1)
+    trajectories.add_argument("--per-player", action="store_true")
+    trajectories.add_argument("--dtype", choices=["float64", "float32", "float16", "uint8"], default="float16")
+    trajectories.add_argument("--seed", type=int, default=0)
+    trajectories.add_argument("--output", required=True, help=".npy file for the trajectories")
+    trajectories.add_argument("--plot", help="image file for a figure of the trajectories")
+    trajectories.add_argument("--n-plotted", type=int, default=100, help="number of groups in the figure")
+    trajectories.set_defaults(function=run_trajectory)
+
+    export = subparsers.add_parser("export", help="write the LCP coefficient tables")
+    export.add_argument("--from-data", action="store_true", help="regenerate the tables from the data (see lcp.py)")
+    export.add_argument("--output", required=True, help="CSV or JSON file for the tables")
+    export.set_defaults(function=run_export)
+
+    check = subparsers.add_parser("check-backends", help="check that all backends give the same results")
+    check.add_argument("--configurations", type=int, default=20, help="number of random configurations")
+    check.add_argument("--backends", nargs="+", choices=engine.get_backend_names(),
+                       help="backends to compare (all available if not given)")
+    check.add_argument("--seed", type=int, default=0)
+    check.set_defaults(function=run_check_backends)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    profiler = None if args.report is None else instrument.enable()
+    args.function(args)
+    if profiler is not None:
+        instrument.disable()
+        profiler.write_report(args.report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
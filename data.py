@@ -0,0 +1,228 @@
+'''
+Access to the experiment data in Data_Main.xlsx.
+
+Parsing the workbook is slow, so it is parsed once and each sheet is cached as a directory of
+typed column files (.npy), which are then loaded memory-mapped. The cache is invalidated when
+the hash of the workbook changes. String columns are stored as integer codes into a table of
+categories, so that filtering on e.g. treatment or country is an integer comparison.
+'''
+import hashlib
+import json
+import os
+import shutil
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data_Main.xlsx")
+
+SHEET_DIFF_TREATMENTS = "DiffTreatments"
+SHEET_DIFF_PROB = "DiffProb"
+
+PLAYER = "player"
+GROUP = "group"
+CONTRIBUTION = "contribution"
+ROUND = "round"
+COUNTRY = "country"
+TREATMENT = "treatment"
+
+# The column names in the workbook
+_COLUMN_NAMES = {"Session/Player": PLAYER, "Group": GROUP, "Contribution": CONTRIBUTION,
+                 "Round": ROUND, "Country": COUNTRY, "Treatment": TREATMENT}
+
+_NS = {"main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+       "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+       "pkg": "http://schemas.openxmlformats.org/package/2006/relationships"}
+
+
+def get_cache_dir(path=DATA_FILE):
+    '''Return the default cache directory of the workbook at path.'''
+    directory, filename = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, ".cache", filename)
+
+
+def get_file_hash(path):
+    '''Return the SHA-256 hash of the file at path.'''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _column_index(cell_reference):
+    '''Return the zero-based column index of a cell reference such as "C12".'''
+    index = 0
+    for character in cell_reference:
+        if not character.isalpha():
+            break
+        index = 26 * index + ord(character.upper()) - ord('A') + 1
+    return index - 1
+
+
+def read_workbook(path=DATA_FILE):
+    '''
+    Parse the xlsx workbook at path and return a dict from sheet name to a list of rows, each a
+    list of cell values (str, int or float, None for empty cells). The first row is the header.
+    '''
+    with zipfile.ZipFile(path) as archive:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            root = ET.fromstring(archive.read("xl/sharedStrings.xml"))
+            for si in root.findall("main:si", _NS):
+                shared_strings.append("".join(t.text or "" for t in si.iter("{%s}t" % _NS["main"])))
+
+        relationships = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {r.get("Id"): r.get("Target") for r in relationships.findall("pkg:Relationship", _NS)}
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        sheets = {}
+        for sheet in workbook.find("main:sheets", _NS):
+            target = targets[sheet.get("{%s}id" % _NS["rel"])]
+            sheet_path = target.lstrip('/') if target.startswith('/') else "xl/" + target
+            with archive.open(sheet_path) as f:
+                sheets[sheet.get("name")] = _read_sheet(f, shared_strings)
+    return sheets
+
+
+def _read_sheet(f, shared_strings):
+    rows = []
+    for _, element in ET.iterparse(f):
+        if element.tag != "{%s}row" % _NS["main"]:
+            continue
+        row = []
+        for cell in element.findall("main:c", _NS):
+            index = _column_index(cell.get("r"))
+            row.extend([None] * (index + 1 - len(row)))
+            cell_type = cell.get("t")
+            value = cell.find("main:v", _NS)
+            if cell_type == "inlineStr":
+                row[index] = "".join(t.text or "" for t in cell.iter("{%s}t" % _NS["main"]))
+            elif value is None:
+                continue
+            elif cell_type == "s":
+                row[index] = shared_strings[int(value.text)]
+            elif cell_type in ("str", "e"):
+                row[index] = value.text
+            elif cell_type == "b":
+                row[index] = int(value.text)
+            else:
+                number = float(value.text)
+                row[index] = int(number) if number.is_integer() else number
+        rows.append(row)
+        element.clear()
+    return rows
+
+
+def _to_column(values):
+    '''
+    Return the values of a column as a typed array, or as integer codes and an array of
+    categories if the column holds strings.
+    '''
+    if all(isinstance(v, int) for v in values):
+        values = np.array(values, dtype=np.int64)
+        if values.size == 0 or (values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max):
+            values = values.astype(np.int16)
+        return values, None
+    if all(isinstance(v, (int, float)) for v in values):
+        return np.array(values, dtype=float), None
+    categories, codes = np.unique(np.array(["" if v is None else str(v) for v in values]), return_inverse=True)
+    return codes.astype(np.int16).reshape(-1), categories
+
+
+def build_cache(path=DATA_FILE, cache_dir=None):
+    '''Parse the workbook at path and write the columns of each sheet to the cache directory.'''
+    if cache_dir is None:
+        cache_dir = get_cache_dir(path)
+    stat = os.stat(path)
+    file_hash = get_file_hash(path)
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    os.makedirs(cache_dir)
+
+    sheets = {}
+    for sheet, rows in read_workbook(path).items():
+        header, rows = rows[0], rows[1:]
+        os.makedirs(os.path.join(cache_dir, sheet))
+        columns = {}
+        for i, name in enumerate(header):
+            column = _COLUMN_NAMES.get(name, name)
+            values, categories = _to_column([row[i] if i < len(row) else None for row in rows])
+            np.save(os.path.join(cache_dir, sheet, column + ".npy"), values)
+            if categories is not None:
+                np.save(os.path.join(cache_dir, sheet, column + ".categories.npy"), categories)
+            columns[column] = categories is not None
+        sheets[sheet] = {"n_rows": len(rows), "columns": columns}
+
+    # The metadata is written last, so that an interrupted build is not taken as a valid cache
+    metadata = {"hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sheets": sheets}
+    with open(os.path.join(cache_dir, "metadata.json"), 'w') as f:
+        json.dump(metadata, f)
+    return metadata
+
+
+def get_metadata(path=DATA_FILE, cache_dir=None):
+    '''
+    Return the metadata of the cache of the workbook at path, building the cache first if it
+    does not exist or if the workbook has changed.
+    '''
+    if cache_dir is None:
+        cache_dir = get_cache_dir(path)
+    metadata_path = os.path.join(cache_dir, "metadata.json")
+    if not os.path.exists(metadata_path):
+        return build_cache(path, cache_dir)
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    # Only hash the workbook if its size or modification time has changed
+    stat = os.stat(path)
+    if (stat.st_size, stat.st_mtime_ns) != (metadata["size"], metadata["mtime_ns"]):
+        if get_file_hash(path) != metadata["hash"]:
+            return build_cache(path, cache_dir)
+        metadata["size"], metadata["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f)
+    return metadata
+
+
+def load_sheet(sheet, columns=None, path=DATA_FILE, cache_dir=None, **filters):
+    '''
+    Return the specified columns (all if None) of the rows of a sheet that match the filters,
+    as a dict from column name to array. String columns are returned as arrays of str.
+
+    Each filter is a column name with a value or a list of values, e.g.
+    load_sheet(SHEET_DIFF_TREATMENTS, [PLAYER, CONTRIBUTION], treatment="Control", round=[1, 2]).
+    Only the requested and filtered columns are read from the cache.
+    '''
+    if cache_dir is None:
+        cache_dir = get_cache_dir(path)
+    metadata = get_metadata(path, cache_dir)
+    sheet_columns = metadata["sheets"][sheet]["columns"]
+    if columns is None:
+        columns = list(sheet_columns)
+    for column in list(columns) + list(filters):
+        assert(column in sheet_columns), f"The sheet {sheet} has no column {column}."
+
+    def _load(column):
+        return np.load(os.path.join(cache_dir, sheet, column + ".npy"), mmap_mode='r')
+
+    def _load_categories(column):
+        return np.load(os.path.join(cache_dir, sheet, column + ".categories.npy"))
+
+    mask = np.ones(metadata["sheets"][sheet]["n_rows"], dtype=bool)
+    for column, wanted in filters.items():
+        if isinstance(wanted, (str, int, float)):
+            wanted = [wanted]
+        if sheet_columns[column]:
+            categories = _load_categories(column)
+            wanted = [i for i, category in enumerate(categories) if category in wanted]
+        mask &= np.isin(_load(column), wanted)
+
+    result = {}
+    for column in columns:
+        values = _load(column)[mask]
+        if sheet_columns[column]:
+            values = _load_categories(column)[values]
+        result[column] = values
+    return result
@@ -0,0 +1,646 @@
+'''
+Array-backed engine for the agent-based simulation.
+
+Instead of one Group object with four Player objects per group, the state of the whole
+population is kept in arrays of shape (n_groups, 4): the player type codes, the intercept and
+slope of each player's LCP profile, and each player's last contribution. Every round advances
+all groups at once with a handful of array operations, and gives the same group contributions
+as Group.run in fig6.py.
+
+Groups of other sizes are arrays of shape (n_groups, group_size). Their others' averages are
+computed from the group sum as (group_sum - own) / (group_size - 1), so a round costs O(n)
+per group of n players. Groups of mixed sizes are run with run_groups_ragged.
+
+The ways of running the groups are registered as named backends (see register_backend), which
+fig6.Simulation selects by name: run_groups (NUMPY_BACKEND), run_groups_closed_form
+(CLOSED_FORM_BACKEND) and, if numba is installed, run_groups_numba (NUMBA_BACKEND), which
+otherwise falls back to run_groups. fig6.check_backends checks that all of them agree.
+'''
+import itertools
+import math
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# The size of the groups in the experiment, and the default group size
+GROUP_SIZE = 4
+
+# The names of the backends registered here (see register_backend)
+NUMPY_BACKEND = "numpy"
+CLOSED_FORM_BACKEND = "closed_form"
+NUMBA_BACKEND = "numba"
+
+# The number of groups that run_groups advances together through all rounds
+CHUNK_SIZE = 16384
+
+# The increase of a player's contribution a number of rounds after the group failed a check,
+# relative to the player's contribution in the round of the failed check (see
+# run_groups_with_checks)
+FAIL_BUMPS = {3: 9 / 4, 4: 16 / 4}
+
+# The magnitude to which run_groups_heterogeneous caps the carried contributions, far beyond
+# the clamping range 0-20, so that diverging groups do not overflow to inf and nan
+HETEROGENEOUS_BOUND = 1e6
+
+# Columns of a coefficient table, which has one row per player type
+INTERCEPT = 0
+SLOPE = 1
+CONTR1 = 2
+
+# For each player in a group, the positions of the other group members
+_OTHERS = [[j for j in range(GROUP_SIZE) if j != i] for i in range(GROUP_SIZE)]
+
+
+def get_player_coefficients(types, coefficients):
+    '''
+    Return the intercepts, slopes and first contributions of the players with the specified
+    type codes, each as an array of the same shape as types. If coefficients has leading
+    dimensions in front of the coefficient table, e.g. one table per treatment, these are
+    prepended to the shape.
+    '''
+    coefficients = np.asarray(coefficients, dtype=float)
+    player_coefficients = coefficients[..., types, :]
+    return (player_coefficients[..., INTERCEPT], player_coefficients[..., SLOPE],
+            player_coefficients[..., CONTR1])
+
+
+def get_others_average(contributions):
+    '''
+    Return the average contribution of the other group members for each player, given the
+    contributions as an array of shape (..., n_groups, group_size). In groups of four, the
+    others are summed in player order, as in Group._get_others_contributions, and in groups of
+    other sizes the average is (group_sum - own) / (group_size - 1), as in Group.run, so the
+    result is identical to the object model.
+    '''
+    group_size = contributions.shape[-1]
+    if group_size == GROUP_SIZE:
+        others = contributions[..., _OTHERS]
+        return (others[..., 0] + others[..., 1] + others[..., 2]) / 3
+    return (sum_players(contributions)[..., np.newaxis] - contributions) / (group_size - 1)
+
+
+def sum_players(contributions, axis=-1):
+    '''
+    Return the sum of the contributions along axis, the players of a group. The players are
+    added one at a time in player order, as the built-in sum in Group.run, so the sum is
+    identical to that of the object model (numpy.sum may add in another order).
+    '''
+    contributions = np.moveaxis(contributions, axis, 0)
+    total = contributions[0].copy()
+    for player_contributions in contributions[1:]:
+        total += player_contributions
+    return total
+
+
+def get_group_contribution(contributions):
+    '''Return the group contribution of each group, clamping each player's contribution to 0-20.'''
+    return sum_players(np.clip(contributions, 0, 20))
+
+
+def run_groups(types, coefficients, n_steps, recorder=None):
+    '''
+    Run n_steps rounds of the public goods game in every group and return the final group
+    contributions as an array of length n_groups.
+
+    types is an integer array of shape (n_groups, group_size) with a type code for each
+    player, and coefficients is the coefficient table indexed by type code, with the columns
+    INTERCEPT, SLOPE and CONTR1. types may also have shape (n_replicates, n_groups, group_size)
+    to run several populations in one pass, in which case the result has shape (n_replicates,
+    n_groups). Likewise, coefficients may have shape (n_tables, n_types, 3) to run the
+    population with several coefficient tables in one pass, which prepends n_tables to the
+    result's shape.
+
+    If a recorder (a trajectory.TrajectoryRecorder) is given, the contributions in the rounds
+    it records are written to it, one chunk of groups at a time.
+    '''
+    assert(n_steps > 2)
+    types = np.asarray(types)
+    assert(types.ndim >= 2 and types.shape[-1] >= 2)
+    a, b, contributions = get_player_coefficients(types, coefficients)
+    return _run_players(a, b, contributions, n_steps, recorder)
+
+
+def run_groups_ragged(types, offsets, coefficients, n_steps):
+    '''
+    Run groups of mixed sizes as in run_groups. types is an integer array with the type codes
+    of all players, group after group, and offsets is an array of length n_groups + 1 such
+    that group i consists of the players offsets[i]:offsets[i + 1]. Every group has at least
+    two players. The groups of each size are gathered into an array of shape (n_groups_of_size,
+    size) and run in one pass of run_groups, so the cost is linear in the number of players.
+    '''
+    types = np.asarray(types)
+    offsets = np.asarray(offsets)
+    assert(types.ndim == 1 and offsets[0] == 0 and offsets[-1] == len(types))
+    group_sizes = np.diff(offsets)
+    assert(np.all(group_sizes >= 2))
+    final_group_contributions = np.empty(np.shape(coefficients)[:-2] + (len(group_sizes),))
+    for group_size in np.unique(group_sizes).tolist():
+        groups = np.flatnonzero(group_sizes == group_size)
+        players = offsets[groups, np.newaxis] + np.arange(group_size)
+        final_group_contributions[..., groups] = run_groups(types[players], coefficients, n_steps)
+    return final_group_contributions
+
+
+def run_groups_heterogeneous(intercepts, slopes, first_contributions, n_steps, recorder=None):
+    '''
+    Run the groups as in run_groups, but with an intercept, slope and first contribution of
+    each player's own, given as arrays of shape (n_groups, group_size). The rounds are computed in the
+    dtype of these arrays, so float32 halves the memory and bandwidth of float64.
+
+    Individual slopes can be large enough for a group's contributions to diverge, which
+    overflows float32 within a few hundred rounds. The carried contributions are therefore
+    capped at +-HETEROGENEOUS_BOUND, where the clamped contributions are 0 or 20 anyway.
+    '''
+    assert(n_steps > 2)
+    intercepts, slopes, first_contributions = np.broadcast_arrays(intercepts, slopes, first_contributions)
+    assert(intercepts.ndim >= 2 and intercepts.shape[-1] >= 2)
+    return _run_players(intercepts, slopes, first_contributions, n_steps, recorder, HETEROGENEOUS_BOUND)
+
+
+def _run_players(a, b, contributions, n_steps, recorder=None, bound=None):
+    '''
+    Run the groups with the players' coefficients a and b and first contributions, of shape
+    (..., group_size).
+    '''
+    shape = a.shape[:-1]
+    group_size = a.shape[-1]
+    if recorder is not None:
+        assert(len(shape) == 1 and recorder.n_groups == shape[0] and group_size == GROUP_SIZE)
+    a, b, contributions = (x.reshape(-1, group_size) for x in (a, b, contributions))
+
+    # The groups are run in chunks small enough to stay in the CPU cache over all rounds
+    final_group_contributions = np.empty(len(a), dtype=np.result_type(a, b, contributions))
+    chunk_size = _get_chunk_size(group_size)
+    for start in range(0, len(a), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        a_chunk, b_chunk, c_chunk = a[chunk].T.copy(), b[chunk].T.copy(), contributions[chunk].T.copy()
+        if group_size == GROUP_SIZE:
+            final_group_contributions[chunk] = _run_chunk(a_chunk, b_chunk, c_chunk, n_steps, recorder, start, bound)
+        else:
+            final_group_contributions[chunk] = get_group_contribution(
+                _advance_chunk(a_chunk, b_chunk, c_chunk, n_steps - 2, bound).T)
+    return final_group_contributions.reshape(shape)
+
+
+def _get_chunk_size(group_size):
+    '''Return the number of groups of group_size players per chunk, CHUNK_SIZE groups of four players.'''
+    return max(1, CHUNK_SIZE * GROUP_SIZE // group_size)
+
+
+def _advance_chunk(a, b, contributions, n_rounds, bound=None):
+    '''
+    Return the unclamped contributions after n_rounds rounds in fixed groups of any size, with
+    a, b and contributions of shape (group_size, n_groups), and the others' averages of
+    _get_others_averages. If bound is given, the carried contributions are capped at +-bound.
+    '''
+    if len(contributions) == GROUP_SIZE:
+        # Unrolled over the positions, which is faster for the small arrays of a chunk
+        a0, a1, a2, a3 = a
+        b0, b1, b2, b3 = b
+        contributions = tuple(contributions)
+        for _ in range(n_rounds):
+            d0, d1, d2, d3 = _get_others_averages(contributions)
+            contributions = (a0 + b0 * d0, a1 + b1 * d1, a2 + b2 * d2, a3 + b3 * d3)
+            if bound is not None:
+                for c in contributions:
+                    np.clip(c, -bound, bound, out=c)
+        return np.stack(contributions)
+
+    for _ in range(n_rounds):
+        contributions = a + b * _get_others_averages(contributions)
+        if bound is not None:
+            np.clip(contributions, -bound, bound, out=contributions)
+    return contributions
+
+
+def _get_others_averages(contributions):
+    '''
+    Return the others' average of each player, one row per position in the group, given the
+    contributions as an array of shape (group_size, n_groups) or a sequence of its rows. In
+    groups of four, the others of each player are summed in player order, as in
+    get_others_average. For other sizes, the others' average is (group_sum - own) /
+    (group_size - 1), with the group sum added in player order as in Group.run.
+    '''
+    if len(contributions) == GROUP_SIZE:
+        c0, c1, c2, c3 = contributions
+        c01 = c0 + c1
+        return (c1 + c2 + c3) / 3, (c0 + c2 + c3) / 3, (c01 + c3) / 3, (c01 + c2) / 3
+    group_sum = sum_players(np.asarray(contributions), axis=0)
+    return (group_sum - contributions) / (len(contributions) - 1)
+
+
+def run_groups_rematched(intercepts, slopes, first_contributions, n_steps, rng, rematch_interval=1, bound=None):
+    '''
+    Run the groups as in run_groups_heterogeneous, but with stranger matching: before every
+    rematch_interval:th round (rounds 1 + rematch_interval, 1 + 2 * rematch_interval, ...) all
+    players are reshuffled into new groups of the same size, using rng, a numpy.random.Generator. Each
+    player keeps its coefficients and last contribution, and in the next round reacts to the
+    average last contribution of its new group members.
+
+    The players are kept in arrays of shape (group_size, n_groups), and a reshuffle is one
+    permutation of all players. If the new groups play more than one round, the coefficients
+    and contributions follow the permutation with one gather each, and the groups are
+    advanced as in run_groups (so that without reshuffles the result is the same). If they
+    play a single round, e.g. with rematch_interval=1, the players instead stay in place and
+    the player at flat index i goes to group permutation[i] % n_groups, so that every group
+    gets group_size players. The group sums are then added up with one bincount into an array
+    of n_groups, which is small enough to stay in the CPU cache, and each player's others'
+    average is (group_sum - own) / (group_size - 1). Return the final contributions of the
+    groups of the last round, as an array of length n_groups. If bound is given, the carried
+    contributions are capped at +-bound (see run_groups_heterogeneous).
+
+    The permutation, about half of each round with rematch_interval=1, is the largest cost
+    that remains: at 10^6 players and 200 rounds, rematch_interval=1 takes 11.4 s against
+    0.87 s for fixed groups, about 13 times as long.
+    '''
+    assert(n_steps > 2 and rematch_interval >= 1)
+    intercepts, slopes, first_contributions = np.broadcast_arrays(intercepts, slopes, first_contributions)
+    assert(intercepts.ndim == 2 and intercepts.shape[1] >= 2)
+    group_size = intercepts.shape[1]
+    a, b, c = (np.ascontiguousarray(x.T) for x in (intercepts, slopes, first_contributions))
+    n_players = a.size
+    # The rounds before which the players are reshuffled, and the last round
+    rematch_rounds = list(range(1 + rematch_interval, n_steps, rematch_interval)) + [n_steps]
+    n_groups = a.shape[1]
+    # The group of each player (indexed as the flattened arrays) while the players stay in
+    # place for a single round, otherwise None
+    groups = None
+    r = 2
+    for i, next_r in enumerate(rematch_rounds):
+        # The groups are fixed until the next reshuffle
+        if groups is None:
+            c = _advance(a, b, c, next_r - r, bound)
+        else:
+            group_sums = np.bincount(groups, weights=c.reshape(-1), minlength=n_groups)
+            others_averages = (group_sums[groups].reshape(c.shape) - c) / (group_size - 1)
+            c = a + b * others_averages.astype(c.dtype, copy=False)
+            if bound is not None:
+                np.clip(c, -bound, bound, out=c)
+        r = next_r
+        if r < n_steps:
+            permutation = rng.permutation(n_players)
+            if rematch_rounds[i + 1] - r == 1:
+                groups = permutation % n_groups
+            else:
+                groups = None
+                players = permutation.reshape(group_size, -1)
+                a, b, c = np.take(a, players), np.take(b, players), np.take(c, players)
+    if groups is None:
+        return get_group_contribution(c.T)
+    group_contributions = np.bincount(groups, weights=np.clip(c, 0, 20).reshape(-1), minlength=n_groups)
+    return group_contributions.astype(c.dtype, copy=False)
+
+
+def _advance(a, b, contributions, n_rounds, bound=None):
+    '''
+    Return the unclamped contributions after n_rounds rounds in fixed groups, with a, b and
+    contributions of shape (group_size, n_groups). The groups are advanced in chunks, as in
+    run_groups, with the update of _advance_chunk, so that without reshuffles
+    run_groups_rematched gives the same result as run_groups.
+    '''
+    contributions = contributions.copy()
+    chunk_size = _get_chunk_size(len(contributions))
+    for start in range(0, contributions.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        contributions[:, chunk] = _advance_chunk(a[:, chunk], b[:, chunk], contributions[:, chunk], n_rounds, bound)
+    return contributions
+
+
+def run_groups_self_responding(types, coefficients, n_steps):
+    '''
+    Run the groups as in run_groups, but with each player responding to its own last
+    contribution in place of each other player's, as Group with respond_to_self=True (the code
+    originally published with the paper). The players of a group then do not interact, and
+    only the group contribution adds them up. types has shape (n_groups, group_size).
+    '''
+    assert(n_steps > 2)
+    types = np.asarray(types)
+    assert(types.ndim == 2 and types.shape[1] >= 2)
+    a, b, contributions = get_player_coefficients(types, coefficients)
+    n_others = types.shape[1] - 1
+    for _ in range(2, n_steps):
+        # The own contribution is added once per other player, as the others in Group.run
+        others_sum = contributions.copy()
+        for _ in range(n_others - 1):
+            others_sum += contributions
+        contributions = a + b * (others_sum / n_others)
+    return get_group_contribution(contributions)
+
+
+def run_groups_paired(types, coefficients, n_steps):
+    '''
+    Run the groups as in run_groups, but with coefficient table i for the populations
+    types[i] only. types has shape (n_tables, ..., n_groups, group_size) and coefficients has shape
+    (n_tables, n_types, 3), and the result has shape (n_tables, ..., n_groups).
+    '''
+    coefficients = np.asarray(coefficients, dtype=float)
+    types = np.asarray(types)
+    n_tables, n_types = coefficients.shape[:2]
+    assert(coefficients.ndim == 3 and len(types) == n_tables)
+    # Offset the type codes of population i into table i of the concatenated tables
+    offsets = (np.arange(n_tables) * n_types).reshape((-1,) + (1,) * (types.ndim - 1))
+    return run_groups(types + offsets, coefficients.reshape(-1, coefficients.shape[-1]), n_steps)
+
+
+def _run_chunk(a, b, contributions, n_steps, recorder=None, start=0, bound=None):
+    '''
+    Run the groups of a chunk, with a, b and contributions of shape (4, n_groups) so that each
+    player position is a contiguous column. start is the index of the first group of the chunk
+    in the population. If bound is given, the carried contributions are capped at +-bound.
+    '''
+    # As in Player.get_contribution, the unclamped LCP contribution is carried to the next round
+    if recorder is None:
+        contributions = _advance_chunk(a, b, contributions, n_steps - 2, bound)
+    else:
+        # The rounds are advanced one at a time, so that each can be recorded
+        buffer = recorder.new_buffer(contributions.shape[1])
+        recorder.add(buffer, 1, np.clip(contributions.T, 0, 20))
+        for r in range(2, n_steps):
+            contributions = _advance_chunk(a, b, contributions, 1, bound)
+            recorder.add(buffer, r, np.clip(contributions.T, 0, 20))
+        recorder.write(start, buffer)
+    return get_group_contribution(contributions.T)
+
+
+def run_groups_until_converged(types, coefficients, n_steps, tolerance, n_stable_steps):
+    '''
+    Run the groups as in run_groups, but stop each group as soon as no player's contribution
+    has changed by tolerance or more in n_stable_steps consecutive rounds. Only the groups
+    that have not yet converged are kept in the arrays that are advanced each round.
+
+    Return the final group contributions and the round in which each group converged (-1 for
+    the groups that did not converge within n_steps rounds).
+    '''
+    assert(n_steps > 2)
+    types = np.asarray(types)
+    assert(types.ndim == 2 and types.shape[1] == GROUP_SIZE)
+    assert(np.ndim(coefficients) == 2)
+    a, b, contributions = get_player_coefficients(types, coefficients)
+    n_groups = len(types)
+    final_group_contributions = np.empty(n_groups)
+    convergence_rounds = np.full(n_groups, -1)
+
+    # The indices, in the population, of the groups still being run
+    active = np.arange(n_groups)
+    stable_steps = np.zeros(n_groups, dtype=int)
+    for step in range(2, n_steps):
+        new_contributions = a + b * get_others_average(contributions)
+        change = np.abs(new_contributions - contributions).max(axis=1)
+        contributions = new_contributions
+        stable_steps = np.where(change < tolerance, stable_steps + 1, 0)
+        converged = stable_steps >= n_stable_steps
+        if converged.any():
+            final_group_contributions[active[converged]] = get_group_contribution(contributions[converged])
+            convergence_rounds[active[converged]] = step
+            keep = ~converged
+            active = active[keep]
+            a, b, contributions, stable_steps = a[keep], b[keep], contributions[keep], stable_steps[keep]
+            if len(active) == 0:
+                break
+    final_group_contributions[active] = get_group_contribution(contributions)
+    return final_group_contributions, convergence_rounds
+
+
+def run_groups_with_checks(types, coefficients, n_steps, check_probability, threshold_range, rng,
+                           fail_bumps=FAIL_BUMPS, recorder=None):
+    '''
+    Run the groups with the treatment mechanics of unused/sim.py and return the final group
+    contributions and the number of failed checks of each group.
+
+    After each round, the round is a check round with probability check_probability, and in a
+    check round the group fails if its group contribution is below a threshold drawn
+    uniformly from the integers in threshold_range (lowest, highest). If the group failed the
+    check three rounds ago, a player contributes its contribution in that round plus
+    fail_bumps[3], else if it failed four rounds ago its contribution then plus fail_bumps[4],
+    and otherwise its LCP contribution. As in unused/sim.py, all contributions are clamped to
+    0-20, also those carried to the next round.
+
+    The check rounds and thresholds are drawn in batch using rng, a numpy.random.Generator,
+    and the contributions and fails of the last four rounds are kept in ring buffers. The
+    contributions can be recorded with a recorder, as in run_groups.
+    '''
+    assert(n_steps > 2)
+    types = np.asarray(types)
+    assert(types.ndim == 2 and types.shape[1] == GROUP_SIZE)
+    assert(sorted(fail_bumps) == [3, 4])
+    assert(np.ndim(coefficients) == 2)
+    a, b, first_contributions = get_player_coefficients(types, coefficients)
+    if recorder is not None:
+        assert(recorder.n_groups == len(types))
+    final_group_contributions = np.empty(len(types))
+    n_failed_checks = np.zeros(len(types), dtype=int)
+    for start in range(0, len(types), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        final_group_contributions[chunk], n_failed_checks[chunk] = _run_chunk_with_checks(
+            a[chunk], b[chunk], first_contributions[chunk], n_steps, check_probability,
+            threshold_range, rng, fail_bumps, recorder, start)
+    return final_group_contributions, n_failed_checks
+
+
+def _run_chunk_with_checks(a, b, first_contributions, n_steps, check_probability, threshold_range, rng,
+                           fail_bumps, recorder, start):
+    n_groups = len(a)
+    n_rounds = n_steps - 1
+    is_check_round = rng.random((n_rounds, n_groups)) < check_probability
+    lowest, highest = threshold_range
+    thresholds = rng.integers(lowest, highest + 1, (n_rounds, n_groups))
+
+    # Round r is kept at position r % 4 of the ring buffers
+    contributions_history = np.zeros((4, n_groups, GROUP_SIZE))
+    fails = np.zeros((4, n_groups), dtype=bool)
+    n_failed_checks = np.zeros(n_groups, dtype=int)
+
+    contributions = np.clip(first_contributions, 0, 20)
+    if recorder is not None:
+        buffer = recorder.new_buffer(n_groups)
+    for r in range(1, n_steps):
+        if r > 1:
+            lcp_contributions = np.clip(a + b * get_others_average(contributions), 0, 20)
+            bumped3 = np.clip(contributions_history[(r - 3) % 4] + fail_bumps[3], 0, 20)
+            bumped4 = np.clip(contributions_history[(r - 4) % 4] + fail_bumps[4], 0, 20)
+            contributions = np.where(fails[(r - 3) % 4, :, np.newaxis], bumped3,
+                                     np.where(fails[(r - 4) % 4, :, np.newaxis], bumped4, lcp_contributions))
+        group_contributions = contributions.sum(axis=1)
+        failed = is_check_round[r - 1] & (group_contributions < thresholds[r - 1])
+        contributions_history[r % 4] = contributions
+        fails[r % 4] = failed
+        n_failed_checks += failed
+        if recorder is not None:
+            recorder.add(buffer, r, contributions)
+    if recorder is not None:
+        recorder.write(start, buffer)
+    return group_contributions, n_failed_checks
+
+
+def _get_affine_update_matrices(a, b):
+    '''
+    Return the update of each group's contributions, x -> a + b * others_average(x), as an
+    array of shape (n_groups, group_size + 1, group_size + 1) of matrices acting on the
+    extended state (x, 1).
+    '''
+    group_size = a.shape[1]
+    others_average = (np.ones((group_size, group_size)) - np.eye(group_size)) / (group_size - 1)
+    matrices = np.zeros((len(a), group_size + 1, group_size + 1))
+    matrices[:, :group_size, :group_size] = b[:, :, np.newaxis] * others_average
+    matrices[:, :group_size, group_size] = a
+    matrices[:, group_size, group_size] = 1
+    return matrices
+
+
+def run_groups_closed_form(types, coefficients, n_steps):
+    '''
+    Return the final group contributions after n_steps rounds, as run_groups, without iterating
+    over the rounds.
+
+    The contribution carried from round to round is the unclamped LCP contribution, so each
+    group's dynamics are affine, x -> a + B x, and the clamping to 0-20 only applies to the
+    group contribution. The state after n rounds is therefore the n:th power of the affine
+    update applied to the first contributions, computed by repeated squaring. Groups are run
+    per unique composition, so the cost does not grow with n_steps or the number of groups.
+
+    If n_steps is None, the group contributions at the fixed point are returned instead.
+    '''
+    types = np.asarray(types)
+    assert(types.ndim == 2 and types.shape[1] >= 2)
+    assert(np.ndim(coefficients) == 2)
+    group_size = types.shape[1]
+    compositions, inverse = np.unique(np.sort(types, axis=1), axis=0, return_inverse=True)
+    a, b, contributions = get_player_coefficients(compositions, coefficients)
+    if n_steps is None:
+        contributions = _get_fixed_points(a, b)
+    else:
+        assert(n_steps > 2)
+        matrices = np.linalg.matrix_power(_get_affine_update_matrices(a, b), n_steps - 2)
+        state = np.concatenate([contributions, np.ones((len(compositions), 1))], axis=1)
+        contributions = np.einsum('gij,gj->gi', matrices, state)[:, :group_size]
+    return get_group_contribution(contributions)[inverse.reshape(-1)]
+
+
+def _get_fixed_points(a, b):
+    '''
+    Return the fixed point x = a + B x of each group's dynamics. The dynamics must be
+    contracting, i.e. all eigenvalues of B inside the unit circle, for the contributions to
+    converge to it.
+    '''
+    group_size = a.shape[1]
+    matrices = _get_affine_update_matrices(a, b)[:, :group_size, :group_size]
+    spectral_radius = np.abs(np.linalg.eigvals(matrices)).max(axis=1)
+    assert(np.all(spectral_radius < 1)), "The contributions do not converge to a fixed point."
+    identity = np.broadcast_to(np.eye(group_size), matrices.shape)
+    return np.linalg.solve(identity - matrices, a[:, :, np.newaxis])[:, :, 0]
+
+
+def get_compositions(n_types, group_size=GROUP_SIZE):
+    '''
+    Return all group compositions of n_types player types, i.e. the multisets of type codes of
+    size group_size, as an array of shape (n_compositions, group_size) with sorted rows.
+    '''
+    compositions = itertools.combinations_with_replacement(range(n_types), group_size)
+    return np.array(list(compositions), dtype=np.int8).reshape(-1, group_size)
+
+
+def get_composition_probabilities(compositions, proportions):
+    '''
+    Return the multinomial probability of each composition when the players of a group are
+    drawn independently with the specified type proportions. proportions has shape
+    (..., n_types) and the result has shape (..., n_compositions), so that many distributions
+    can be evaluated at once.
+    '''
+    proportions = np.asarray(proportions, dtype=float)
+    n_types = proportions.shape[-1]
+    group_size = compositions.shape[1]
+    counts = np.stack([np.count_nonzero(compositions == t, axis=1) for t in range(n_types)], axis=1)
+    multiplicities = np.array([math.factorial(group_size) / math.prod(math.factorial(k) for k in row)
+                               for row in counts])
+    return multiplicities * np.prod(proportions[..., np.newaxis, :] ** counts, axis=-1)
+
+
+def _run_groups_loop(a, b, contributions, n_steps):
+    '''
+    Run the groups one at a time, with a, b and contributions of shape (n_groups, 4), and
+    return the final group contributions. This is the kernel of run_groups_numba, compiled by
+    numba if it is installed. The arithmetic is that of _run_chunk, in the same order and
+    without fastmath, so the results are identical to those of run_groups.
+    '''
+    n_groups = a.shape[0]
+    final_group_contributions = np.empty(n_groups)
+    for g in _prange(n_groups):
+        a0, a1, a2, a3 = a[g, 0], a[g, 1], a[g, 2], a[g, 3]
+        b0, b1, b2, b3 = b[g, 0], b[g, 1], b[g, 2], b[g, 3]
+        c0, c1, c2, c3 = contributions[g, 0], contributions[g, 1], contributions[g, 2], contributions[g, 3]
+        for _ in range(2, n_steps):
+            c01 = c0 + c1
+            c0, c1, c2, c3 = (a0 + b0 * ((c1 + c2 + c3) / 3), a1 + b1 * ((c0 + c2 + c3) / 3),
+                              a2 + b2 * ((c01 + c3) / 3), a3 + b3 * ((c01 + c2) / 3))
+        final_group_contributions[g] = (min(max(c0, 0.0), 20.0) + min(max(c1, 0.0), 20.0)
+                                        + min(max(c2, 0.0), 20.0) + min(max(c3, 0.0), 20.0))
+    return final_group_contributions
+
+
+if numba is not None:
+    _prange = numba.prange
+    _run_groups_jit = numba.njit(parallel=True, cache=True)(_run_groups_loop)
+else:
+    _prange = range
+    _run_groups_jit = None
+
+
+def run_groups_numba(types, coefficients, n_steps):
+    '''
+    Run the groups as in run_groups, with a loop over the groups and rounds compiled by numba
+    (spread over the CPUs), so that each group's contributions stay in registers over all
+    rounds. Requires numba, and groups of four.
+    '''
+    assert(_run_groups_jit is not None), "numba is not installed."
+    assert(n_steps > 2)
+    types = np.asarray(types)
+    assert(types.ndim >= 2 and types.shape[-1] == GROUP_SIZE)
+    assert(np.ndim(coefficients) == 2)
+    a, b, contributions = (np.ascontiguousarray(x.reshape(-1, GROUP_SIZE))
+                           for x in get_player_coefficients(types, coefficients))
+    return _run_groups_jit(a, b, contributions, n_steps).reshape(types.shape[:-1])
+
+
+# Backend name -> (function, name of the backend to use instead if function is None)
+_BACKENDS = {}
+
+
+def register_backend(name, function, fallback=None):
+    '''
+    Register a backend: function(types, coefficients, n_steps) runs the groups with the
+    type codes types, of shape (n_groups, group_size), and the coefficient table
+    coefficients, and returns the final group contributions, as run_groups. A backend that
+    needs an optional dependency that is not installed is registered with function None and
+    a fallback, the name of the backend that get_backend returns instead.
+    '''
+    assert(function is not None or fallback is not None)
+    _BACKENDS[name] = (function, fallback)
+
+
+def get_backend(name):
+    '''
+    Return the function of the backend name (see register_backend), or, with a warning, that
+    of its fallback if the backend is not available.
+    '''
+    assert(name in _BACKENDS), f"Unknown backend {name}."
+    function, fallback = _BACKENDS[name]
+    if function is None:
+        warnings.warn(f"The backend {name} is not available, using {fallback} instead.", RuntimeWarning)
+        return get_backend(fallback)
+    return function
+
+
+def get_backend_names(available=True):
+    '''Return the names of the registered backends, only those that are available if available is True.'''
+    return [name for name, (function, _) in _BACKENDS.items() if function is not None or not available]
+
+
+register_backend(NUMPY_BACKEND, run_groups)
+register_backend(CLOSED_FORM_BACKEND, run_groups_closed_form)
+register_backend(NUMBA_BACKEND, None if numba is None else run_groups_numba, fallback=NUMPY_BACKEND)
@@ -1,18 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import json
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 
+import engine
+import instrument
+import store
+
 
 CONTROL = "Control"
 TREATMENT_10P = "10P"
 TREATMENT_40P = "40P"
 TREATMENT_LEVEL = "Level"
 TREATMENT_IMPACT = "Impact"
+TREATMENTS = [CONTROL, TREATMENT_10P, TREATMENT_40P, TREATMENT_LEVEL, TREATMENT_IMPACT]
+
+# The treatments over which the average LCP profiles of the player types are taken
+AVERAGED_TREATMENTS = [TREATMENT_10P, TREATMENT_40P, TREATMENT_LEVEL, TREATMENT_IMPACT]
+
+# The LCP profiles the players can use: those of a treatment, or the average (the default)
+AVERAGE = "Average"
+PROFILES = TREATMENTS + [AVERAGE]
 
 UNCONDITIONAL_COOPERATOR = "UC"
 CONDITIONAL_COOPERATOR = "CC"
 FREE_RIDER = "FR"
 
+# The order of the player types defines their type codes in the array-backed engine
+PLAYER_TYPES = [UNCONDITIONAL_COOPERATOR, CONDITIONAL_COOPERATOR, FREE_RIDER]
+
+# The default number of players per group, as in the experiment
+GROUP_SIZE = engine.GROUP_SIZE
+
+# A group is successful if its final group contribution is at least THRESHOLD
+THRESHOLD = 60
+
+# The thresholds of the threshold x UC heatmap of vary_threshold_uc, spanning the range of
+# the random threshold in TREATMENT_LEVEL (see get_threshold_range)
+THRESHOLDS = np.arange(50, 71)
+
+# The backends of Simulation: the Group and Player objects, and those registered in engine.py
+OBJECT_BACKEND = "object"
+NUMPY_BACKEND = engine.NUMPY_BACKEND
+CLOSED_FORM_BACKEND = engine.CLOSED_FORM_BACKEND
+NUMBA_BACKEND = engine.NUMBA_BACKEND
+
+# The number of groups that StreamingSimulation samples and runs at a time
+STREAM_CHUNK_SIZE = 2**18
+
+# The levels of the contour plot of vary_uc_fr
+CONTOUR_LEVELS = np.linspace(0, 1, 11)
+
+# Part of the key of stored sweep results. Increase when a change gives different results for
+# the same parameters, so that old results are not reused.
+RESULTS_VERSION = 2
+
 
 def sliding_average(values, sample_size):
     '''Return the sliding average of the values in the specified list using depth sample_size.'''
@@ -25,6 +71,34 @@ def sliding_average(values, sample_size):
     return out
 
 
+def get_treatment_average(table):
+    '''Return the average over AVERAGED_TREATMENTS of a dict with a value per treatment.'''
+    return sum([table[treatment] for treatment in AVERAGED_TREATMENTS]) / len(AVERAGED_TREATMENTS)
+
+
+def get_check_probability(treatment):
+    '''Return the probability that a round is a check round in the specified treatment.'''
+    if treatment in (TREATMENT_40P, TREATMENT_IMPACT, TREATMENT_LEVEL):
+        return 0.4
+    elif treatment == TREATMENT_10P:
+        return 0.1
+    else:
+        return 0
+
+
+def get_threshold_range(treatment):
+    '''
+    Return the lowest and highest threshold of the group contribution in a check round in the
+    specified treatment. The threshold is drawn uniformly from the integers in this range.
+    '''
+    if treatment in (TREATMENT_10P, TREATMENT_40P, TREATMENT_IMPACT):
+        return (THRESHOLD, THRESHOLD)
+    elif treatment == TREATMENT_LEVEL:
+        return (50, 70)
+    else:
+        return (0, 0)
+
+
 class Distribution():
     '''
     A class representing a distribution of player types.
@@ -38,8 +112,21 @@ class Distribution():
         self.fr = fr
         self.cc = 1 - (uc + fr)
 
-    def _sample(self):
-        r = random.random()
+    def get_proportions(self):
+        '''Return the proportions of the player types, in the order of PLAYER_TYPES.'''
+        proportions = {UNCONDITIONAL_COOPERATOR: self.uc, CONDITIONAL_COOPERATOR: self.cc,
+                       FREE_RIDER: self.fr}
+        return [proportions[player_type] for player_type in PLAYER_TYPES]
+
+    def get_composition_probabilities(self):
+        '''
+        Return the probability that a sampled group has each of the compositions in
+        get_compositions().
+        '''
+        return engine.get_composition_probabilities(get_compositions(), self.get_proportions())
+
+    def _sample(self, rng=random):
+        r = rng.random()
         if r < self.uc:
             return UNCONDITIONAL_COOPERATOR
         elif r < self.uc + self.fr:
@@ -47,10 +134,10 @@ class Distribution():
         else:
             return CONDITIONAL_COOPERATOR
 
-    def sample_group(self):
+    def sample_group(self, rng=random, group_size=GROUP_SIZE):
         group = []
-        for _ in range(4):
-            s = self._sample()
+        for _ in range(group_size):
+            s = self._sample(rng)
             if s == UNCONDITIONAL_COOPERATOR:
                 player = UnconditionalCooperator()
             elif s == CONDITIONAL_COOPERATOR:
@@ -60,54 +147,201 @@ class Distribution():
             group.append(player)
         return Group(group)
 
+    def sample_types(self, n_groups, rng, stratified=False, group_size=GROUP_SIZE):
+        '''
+        Return the type codes (see PLAYER_TYPES) of the players of n_groups groups, as an int8
+        array of shape (n_groups, group_size), drawn in one call using rng, a
+        numpy.random.Generator. See sample_players.
+        '''
+        return self.sample_players(n_groups * group_size, rng, stratified).reshape(n_groups, group_size)
+
+    def sample_players(self, size, rng, stratified=False):
+        '''
+        Return the type codes (see PLAYER_TYPES) of size players, as an int8 array, drawn in one
+        call using rng, a numpy.random.Generator.
+
+        If stratified is True, the number of players of each type is fixed to the proportions
+        of the distribution (rounded by largest remainder) and only the assignment of players
+        to groups is random, which removes the sampling variance in the type counts.
+        '''
+        if stratified:
+            expected_counts = np.array(self.get_proportions()) * size
+            counts = np.floor(expected_counts).astype(int)
+            largest_remainders = np.argsort(counts - expected_counts, kind='stable')
+            counts[largest_remainders[:size - counts.sum()]] += 1
+            codes = np.repeat(np.arange(len(PLAYER_TYPES), dtype=np.int8), counts)
+            return rng.permutation(codes)
+
+        # The same partition of [0, 1) as in _sample
+        r = rng.random(size)
+        types = np.full(size, PLAYER_TYPES.index(CONDITIONAL_COOPERATOR), dtype=np.int8)
+        types[r < self.uc + self.fr] = PLAYER_TYPES.index(FREE_RIDER)
+        types[r < self.uc] = PLAYER_TYPES.index(UNCONDITIONAL_COOPERATOR)
+        return types
+
+
+class OrderedDistribution(Distribution):
+    '''
+    A distribution of player types that partitions [0, 1) in the order of cooperativeness, UC,
+    then CC, then FR, rather than UC, FR, CC as Distribution. With the same random numbers, a
+    player can then only become more cooperative when UC and UC + CC both increase, e.g. when UC
+    increases with CC/FR constant (see find_uc_crossing).
+    '''
+
+    def _sample(self, rng=random):
+        r = rng.random()
+        if r < self.uc:
+            return UNCONDITIONAL_COOPERATOR
+        elif r < self.uc + self.cc:
+            return CONDITIONAL_COOPERATOR
+        else:
+            return FREE_RIDER
+
+    def sample_players(self, size, rng, stratified=False):
+        if stratified:
+            return super().sample_players(size, rng, stratified)
+        r = rng.random(size)
+        types = np.full(size, PLAYER_TYPES.index(FREE_RIDER), dtype=np.int8)
+        types[r < self.uc + self.cc] = PLAYER_TYPES.index(CONDITIONAL_COOPERATOR)
+        types[r < self.uc] = PLAYER_TYPES.index(UNCONDITIONAL_COOPERATOR)
+        return types
+
 
 class Population():
     '''
     A class representing a population of players.
+
+    The player types are sampled in bulk (see Distribution.sample_types) using rng, a
+    numpy.random.Generator, or a generator seeded from the random module if not given. The
+    Group and Player objects are only created when groups is first accessed.
+
+    The groups have group_size players each. group_size may instead be an array with the size
+    of each group, for groups of mixed sizes (summing to size). The type codes are then kept
+    as one array of all players, group after group, with the offsets of the groups in offsets
+    (see engine.run_groups_ragged).
+
+    respond_to_self is passed on to the Group objects (see Group).
     '''
 
-    def __init__(self, size, distribution):
-        assert(size % 4 == 0)
+    def __init__(self, size, distribution, rng=None, stratified=False, group_size=GROUP_SIZE,
+                 respond_to_self=False):
         self.size = size
-        self.n_groups = size // 4
         self.distribution = distribution
-        self._create_groups()
-    
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
+        if np.ndim(group_size) == 0:
+            assert(group_size >= 2 and size % group_size == 0)
+            self.n_groups = size // group_size
+            self.offsets = None
+            with instrument.phase("sample"):
+                self.types = distribution.sample_types(self.n_groups, rng, stratified, group_size)
+        else:
+            group_sizes = np.asarray(group_size)
+            assert(np.all(group_sizes >= 2) and group_sizes.sum() == size)
+            self.n_groups = len(group_sizes)
+            self.offsets = np.concatenate([[0], np.cumsum(group_sizes)])
+            with instrument.phase("sample"):
+                self.types = distribution.sample_players(size, rng, stratified)
+        self.group_size = group_size
+        self.respond_to_self = respond_to_self
+        self._groups = None
+
+    @property
+    def groups(self):
+        '''The Group objects of the population, created from the type codes when first accessed.'''
+        if self._groups is None:
+            self._create_groups()
+        return self._groups
+
     def _create_groups(self):
-        self.groups = []
-        for i in range(self.n_groups):
-            group = self.distribution.sample_group()
-            self.groups.append(group)
+        with instrument.phase("create_groups"):
+            self._groups = []
+            if self.offsets is None:
+                groups_codes = self.types.tolist()
+            else:
+                groups_codes = np.split(self.types, self.offsets[1:-1])
+            for codes in groups_codes:
+                group = Group([PLAYER_CLASSES[code]() for code in codes], self.respond_to_self)
+                self._groups.append(group)
+
+    def get_types(self):
+        '''
+        Return the type codes of all players as an array of shape (n_groups, group_size), or of
+        length size for groups of mixed sizes.
+        '''
+        return self.types
+
+    def run_memoized(self, n_steps, coefficients):
+        '''
+        Run all groups, simulating each unique group composition only once (see
+        run_composition), and set the final group contribution of each Group object, if they
+        have been created. Return the final group contributions as an array.
+        '''
+        assert(self.offsets is None)
+        types = np.sort(self.get_types(), axis=1)
+        compositions, inverse = np.unique(types, axis=0, return_inverse=True)
+        coefficients = tuple(map(tuple, coefficients))
+        contributions = np.array([run_composition(tuple(composition), coefficients, n_steps)
+                                  for composition in compositions.tolist()])
+        final_group_contributions = contributions[inverse.reshape(-1)]
+        if self._groups is not None:
+            for group, final_group_contribution in zip(self._groups, final_group_contributions):
+                group.final_group_contribution = final_group_contribution
+        return final_group_contributions
 
 
 class Group():
     '''
     A class representing a group of players interacting in the public goods game.
+
+    With respond_to_self=True, each player responds to its own last contribution in place of
+    each other player's, as in the code originally published with the paper (see README.md),
+    so that the published Figure 6 can be reproduced.
     '''
 
-    def __init__(self, players):
+    def __init__(self, players, respond_to_self=False):
         self.players = players  # List of Player objects
+        self.respond_to_self = respond_to_self
 
         # Result
         self.final_group_contribution = None
+        self.convergence_round = None
 
     def _get_others_contributions(self, player):
         others_contributions = []
         for other_player in self.players:
             if other_player != player:
-                others_contributions.append(player.last_contribution)
-        assert(len(others_contributions) == 3)
+                if self.respond_to_self:
+                    others_contributions.append(player.last_contribution)
+                else:
+                    others_contributions.append(other_player.last_contribution)
+        assert(len(others_contributions) == len(self.players) - 1)
         return others_contributions
 
-    def run(self, n_steps):
+    def run(self, n_steps, tolerance=None, n_stable_steps=5):
+        '''
+        Run the group for n_steps rounds. If tolerance is given, the group stops as soon as no
+        player's contribution has changed by tolerance or more in n_stable_steps consecutive
+        rounds, and the round in which it stopped is stored in convergence_round (-1 if it
+        did not converge).
+        '''
         # Contributions in first round
         for player in self.players:
             player.get_first_contribution_avg()
         
+        stable_steps = 0
         for step in range(2, n_steps):
-            for player in self.players:
-                others_contributions = self._get_others_contributions(player)
-                player.others_average = sum(others_contributions) / len(others_contributions)
+            previous_contributions = [player.last_contribution for player in self.players]
+            if len(self.players) == GROUP_SIZE or self.respond_to_self:
+                for player in self.players:
+                    others_contributions = self._get_others_contributions(player)
+                    player.others_average = sum(others_contributions) / len(others_contributions)
+            else:
+                # In groups of other sizes, the others' average is computed from the group sum,
+                # which is linear rather than quadratic in the group size
+                group_sum = sum(previous_contributions)
+                for player in self.players:
+                    player.others_average = (group_sum - player.last_contribution) / (len(self.players) - 1)
             
             c = []
             for player in self.players:
@@ -117,6 +351,20 @@ class Group():
                 c_sum = sum(c)
                 self.final_group_contribution = c_sum
 
+            if tolerance is not None:
+                change = max(abs(player.last_contribution - previous_contribution)
+                             for player, previous_contribution in zip(self.players, previous_contributions))
+                if change < tolerance:
+                    stable_steps += 1
+                else:
+                    stable_steps = 0
+                if stable_steps >= n_stable_steps:
+                    self.final_group_contribution = sum(c)
+                    self.convergence_round = step
+                    return
+        if tolerance is not None:
+            self.convergence_round = -1
+
 
 class Player():
     '''
@@ -148,15 +396,17 @@ class UnconditionalCooperator(Player):
     A class representing an unconditional player, inheriting from the Player class.
     '''
 
-    YINTERCEPT = {TREATMENT_10P: 17.51459397, TREATMENT_40P: 16.78084913,
-                  TREATMENT_LEVEL: 18.70653308, TREATMENT_IMPACT: 17.3972948} #{CONTROL: 16.21719439, 
-    SLOPE = {TREATMENT_10P: -0.065673995, TREATMENT_40P: 0.006177229,
-             TREATMENT_LEVEL: -0.020941855, TREATMENT_IMPACT: -0.02865642}  # CONTROL: 0.039325507, 
-    CONTR1 = {TREATMENT_10P: 14.72727273, TREATMENT_40P: 14.2967033,
-              TREATMENT_LEVEL: 15.5375, TREATMENT_IMPACT: 14.79746835}  # CONTROL: 14.92105263
-    YINTERCEPT_AVG = sum(list(YINTERCEPT.values())) / len(YINTERCEPT)
-    SLOPE_AVG = sum(list(SLOPE.values())) / len(SLOPE)
-    CONTR1_AVG = sum(list(CONTR1.values())) / len(CONTR1)
+    TYPE = UNCONDITIONAL_COOPERATOR
+
+    YINTERCEPT = {CONTROL: 16.21719439, TREATMENT_10P: 17.51459397, TREATMENT_40P: 16.78084913,
+                  TREATMENT_LEVEL: 18.70653308, TREATMENT_IMPACT: 17.3972948}
+    SLOPE = {CONTROL: 0.039325507, TREATMENT_10P: -0.065673995, TREATMENT_40P: 0.006177229,
+             TREATMENT_LEVEL: -0.020941855, TREATMENT_IMPACT: -0.02865642}
+    CONTR1 = {CONTROL: 14.92105263, TREATMENT_10P: 14.72727273, TREATMENT_40P: 14.2967033,
+              TREATMENT_LEVEL: 15.5375, TREATMENT_IMPACT: 14.79746835}
+    YINTERCEPT_AVG = get_treatment_average(YINTERCEPT)
+    SLOPE_AVG = get_treatment_average(SLOPE)
+    CONTR1_AVG = get_treatment_average(CONTR1)
 
     def __init__(self):
         super().__init__()
@@ -175,15 +425,17 @@ class ConditionalCooperator(Player):
     A class representing an conditional player, inheriting from the Player class.
     '''
 
-    YINTERCEPT = {TREATMENT_10P: 2.668407923, TREATMENT_40P: 1.984160769,
-                  TREATMENT_LEVEL: -2.658563959, TREATMENT_IMPACT: 1.269983166}  # CONTROL: 2.060553218, 
-    SLOPE = {TREATMENT_10P: 0.769928283, TREATMENT_40P: 0.80767842,
-             TREATMENT_LEVEL: 1.051772529, TREATMENT_IMPACT: 0.832255046}  # CONTROL: 0.827547183, 
-    CONTR1 = {TREATMENT_10P: 12.78333333, TREATMENT_40P: 12.04081633,
-              TREATMENT_LEVEL: 12.11538462, TREATMENT_IMPACT: 10.85185185}  # CONTROL: 12.38541667
-    YINTERCEPT_AVG = sum(list(YINTERCEPT.values())) / len(YINTERCEPT)
-    SLOPE_AVG = sum(list(SLOPE.values())) / len(SLOPE)
-    CONTR1_AVG = sum(list(CONTR1.values())) / len(CONTR1)
+    TYPE = CONDITIONAL_COOPERATOR
+
+    YINTERCEPT = {CONTROL: 2.060553218, TREATMENT_10P: 2.668407923, TREATMENT_40P: 1.984160769,
+                  TREATMENT_LEVEL: -2.658563959, TREATMENT_IMPACT: 1.269983166}
+    SLOPE = {CONTROL: 0.827547183, TREATMENT_10P: 0.769928283, TREATMENT_40P: 0.80767842,
+             TREATMENT_LEVEL: 1.051772529, TREATMENT_IMPACT: 0.832255046}
+    CONTR1 = {CONTROL: 12.38541667, TREATMENT_10P: 12.78333333, TREATMENT_40P: 12.04081633,
+              TREATMENT_LEVEL: 12.11538462, TREATMENT_IMPACT: 10.85185185}
+    YINTERCEPT_AVG = get_treatment_average(YINTERCEPT)
+    SLOPE_AVG = get_treatment_average(SLOPE)
+    CONTR1_AVG = get_treatment_average(CONTR1)
 
     def __init__(self):
         super().__init__()
@@ -202,15 +454,17 @@ class FreeRider(Player):
     A class representing an free-riding player, inheriting from the Player class.
     '''
 
-    YINTERCEPT = {TREATMENT_10P: 4.562105652, TREATMENT_40P: 0.623097156,
-                  TREATMENT_LEVEL: 4.182532558, TREATMENT_IMPACT: 7.031233664}  # CONTROL: 1.408893192
-    SLOPE = {TREATMENT_10P: 0.161445329, TREATMENT_40P: 0.333341747,
-             TREATMENT_LEVEL: 0.171781389, TREATMENT_IMPACT: -0.129197627}  # CONTROL: 0.245394485
-    CONTR1 = {TREATMENT_10P: 9.666666667, TREATMENT_40P: 5.714285714,
-              TREATMENT_LEVEL: 15, TREATMENT_IMPACT: 8.333333333}  # CONTROL: 7.111111111, 
-    YINTERCEPT_AVG = sum(list(YINTERCEPT.values())) / len(YINTERCEPT)
-    SLOPE_AVG = sum(list(SLOPE.values())) / len(SLOPE)
-    CONTR1_AVG = sum(list(CONTR1.values())) / len(CONTR1)
+    TYPE = FREE_RIDER
+
+    YINTERCEPT = {CONTROL: 1.408893192, TREATMENT_10P: 4.562105652, TREATMENT_40P: 0.623097156,
+                  TREATMENT_LEVEL: 4.182532558, TREATMENT_IMPACT: 7.031233664}
+    SLOPE = {CONTROL: 0.245394485, TREATMENT_10P: 0.161445329, TREATMENT_40P: 0.333341747,
+             TREATMENT_LEVEL: 0.171781389, TREATMENT_IMPACT: -0.129197627}
+    CONTR1 = {CONTROL: 7.111111111, TREATMENT_10P: 9.666666667, TREATMENT_40P: 5.714285714,
+              TREATMENT_LEVEL: 15, TREATMENT_IMPACT: 8.333333333}
+    YINTERCEPT_AVG = get_treatment_average(YINTERCEPT)
+    SLOPE_AVG = get_treatment_average(SLOPE)
+    CONTR1_AVG = get_treatment_average(CONTR1)
 
     def __init__(self):
         super().__init__()
@@ -224,57 +478,1068 @@ class FreeRider(Player):
         return a + b * self.others_average
 
 
+# The player class of each type code
+PLAYER_CLASSES = [UnconditionalCooperator, ConditionalCooperator, FreeRider]
+assert([player_class.TYPE for player_class in PLAYER_CLASSES] == PLAYER_TYPES)
+
+
+def get_coefficient_matrix():
+    '''
+    Return the LCP coefficients of the player types for each of PROFILES as an array of shape
+    (len(PROFILES), len(PLAYER_TYPES), 3), indexed by profile, type code and coefficient (the
+    columns engine.INTERCEPT, engine.SLOPE and engine.CONTR1).
+    '''
+    matrix = np.zeros((len(PROFILES), len(PLAYER_TYPES), 3))
+    for j, player_class in enumerate(PLAYER_CLASSES):
+        for i, treatment in enumerate(TREATMENTS):
+            matrix[i, j, engine.INTERCEPT] = player_class.YINTERCEPT[treatment]
+            matrix[i, j, engine.SLOPE] = player_class.SLOPE[treatment]
+            matrix[i, j, engine.CONTR1] = player_class.CONTR1[treatment]
+        i = PROFILES.index(AVERAGE)
+        matrix[i, j, engine.INTERCEPT] = player_class.YINTERCEPT_AVG
+        matrix[i, j, engine.SLOPE] = player_class.SLOPE_AVG
+        matrix[i, j, engine.CONTR1] = player_class.CONTR1_AVG
+    return matrix
+
+
+def get_coefficient_table(profile=AVERAGE):
+    '''
+    Return the LCP coefficients of the player types for the specified profile (a treatment or
+    AVERAGE) as an array with one row per type code (see PLAYER_TYPES) and the columns
+    engine.INTERCEPT, engine.SLOPE and engine.CONTR1. If profile is a list of profiles, the
+    tables are stacked along a first axis, so that the engine runs all of them in one pass.
+    '''
+    matrix = get_coefficient_matrix()
+    if isinstance(profile, str):
+        return matrix[PROFILES.index(profile)]
+    return matrix[[PROFILES.index(p) for p in profile]]
+
+
+def run_object_groups(types, coefficients, n_steps):
+    '''
+    Run a Group object for each row of type codes in types and return the final group
+    contributions, as engine.run_groups. The Player classes use the average profiles, so
+    coefficients must be the table of AVERAGE.
+    '''
+    assert(np.array_equal(coefficients, get_coefficient_table(AVERAGE)))
+    final_group_contributions = []
+    for codes in np.asarray(types).tolist():
+        group = Group([PLAYER_CLASSES[code]() for code in codes])
+        group.run(n_steps)
+        final_group_contributions.append(group.final_group_contribution)
+    return np.array(final_group_contributions)
+
+
+engine.register_backend(OBJECT_BACKEND, run_object_groups)
+
+
+def get_coefficients_hash():
+    '''Return a hash of the coefficient tables (YINTERCEPT, SLOPE, CONTR1) of all player types.'''
+    tables = {player_class.TYPE: [player_class.YINTERCEPT, player_class.SLOPE, player_class.CONTR1]
+              for player_class in PLAYER_CLASSES}
+    s = json.dumps(tables, sort_keys=True)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+def get_compositions():
+    '''Return all compositions of a group of four players as an array of sorted type codes.'''
+    return engine.get_compositions(len(PLAYER_TYPES))
+
+
+@functools.lru_cache(maxsize=4096)
+def run_composition(composition, coefficients, n_steps):
+    '''
+    Return the final group contribution of a group with the specified composition, a sorted
+    tuple of type codes, using the coefficient table given as a tuple of rows. Since the
+    dynamics are deterministic given the composition, each composition is run only once for
+    each coefficient table and number of rounds, also across Simulation instances.
+    '''
+    types = np.array([composition])
+    return float(engine.run_groups(types, np.array(coefficients), n_steps)[0])
+
+
+def get_composition_contributions(n_steps, profile=AVERAGE):
+    '''
+    Return the final group contribution of each composition in get_compositions(), with the
+    LCP profiles of the specified treatment or AVERAGE.
+    '''
+    coefficients = tuple(map(tuple, get_coefficient_table(profile)))
+    return np.array([run_composition(tuple(composition), coefficients, n_steps)
+                     for composition in get_compositions().tolist()])
+
+
+def get_expected_proportion_successful_groups(proportions, n_steps, profile=AVERAGE, threshold=THRESHOLD):
+    '''
+    Return the expected proportion of successful groups for the type proportions (in the order
+    of PLAYER_TYPES), computed from the probabilities of the group compositions. proportions
+    may have shape (..., 3) to evaluate many distributions at once. If threshold is an array of
+    thresholds, its shape is appended to the result's shape.
+    '''
+    if np.ndim(threshold) > 0:
+        return np.stack([get_expected_proportion_successful_groups(proportions, n_steps, profile, t)
+                         for t in np.ravel(threshold)], axis=-1).reshape(np.shape(proportions)[:-1] + np.shape(threshold))
+    successful = get_composition_contributions(n_steps, profile) >= threshold
+    probabilities = engine.get_composition_probabilities(get_compositions()[successful], proportions)
+    return probabilities.sum(axis=-1)
+
+
+def get_proportion_successful_groups(final_group_contributions, threshold=THRESHOLD, is_sorted=False):
+    '''
+    Return the proportion of the final group contributions, along the last axis, that are at
+    least threshold. threshold may be an array of thresholds, whose shape is then appended to
+    the result's shape. The contributions are sorted (unless is_sorted is True, e.g. for
+    Simulation.get_sorted_group_contributions), so that each threshold is a binary search. A nan
+    contribution is never successful, but still counts as a group.
+    '''
+    contributions = np.asarray(final_group_contributions)
+    if not is_sorted:
+        contributions = np.sort(contributions, axis=-1)
+    n_groups = contributions.shape[-1]
+    rows = contributions.reshape(-1, n_groups)
+    # The number of contributions below each threshold is its insertion point, and nan sorts
+    # after all other values, so the successful groups are those between it and the first nan
+    n_valid = n_groups - np.isnan(rows).sum(axis=1)
+    counts = np.array([n - np.searchsorted(row, threshold, side='left')
+                       for row, n in zip(rows, n_valid)])
+    return (counts / n_groups).reshape(contributions.shape[:-1] + np.shape(threshold))
+
+
+def get_survival_curve(final_group_contributions, weights=None):
+    '''
+    Return the distinct final group contributions in increasing order, and the proportion of
+    groups whose final group contribution is at least each of them, i.e. the proportion of
+    successful groups with each of them as the threshold. If weights are given (e.g. the
+    probabilities of the group compositions), the proportions are weighted by them.
+    '''
+    contributions = np.asarray(final_group_contributions).reshape(-1)
+    order = np.argsort(contributions, kind='stable')
+    contributions = contributions[order]
+    weights = np.ones(len(contributions)) if weights is None else np.asarray(weights, dtype=float)[order]
+    distinct_contributions, first = np.unique(contributions, return_index=True)
+    # The weight of the groups at or above each position in the sorted contributions
+    weights_at_least = np.cumsum(weights[::-1])[::-1]
+    return distinct_contributions, weights_at_least[first] / weights.sum()
+
+
 class Simulation():
     '''
     A class representing a run of the agent-based simulation.
+
+    With backend OBJECT_BACKEND each Group object is run on its own, with NUMPY_BACKEND all
+    groups are advanced at once by the array-backed engine, and with NUMBA_BACKEND by a loop
+    compiled by numba (or as with NUMPY_BACKEND if numba is not installed). All give the same
+    group contributions (see check_backends). With CLOSED_FORM_BACKEND the state after n_steps
+    rounds is computed directly (see engine.run_groups_closed_form), and run(None) gives the
+    converged contributions. backend may be any backend registered with
+    engine.register_backend.
+
+    With memoize=True each unique group composition in the population is simulated only once
+    and its result is shared by all groups with that composition.
+
+    With a treatment, the stochastic treatment mechanics of unused/sim.py (check rounds,
+    thresholds and increased contributions after failed checks, see
+    engine.run_groups_with_checks) are simulated, and the number of failed checks of each group
+    is stored in n_failed_checks.
+
+    With exact=True no population is sampled. Instead each group composition is run once, and
+    the proportion of successful groups is its expected value under the distribution.
+
+    The players use the LCP profiles of profile, a treatment or AVERAGE. With the numpy backend,
+    profile may also be a list of profiles, e.g. PROFILES. The population is then run with all
+    of them in one batched pass, final_group_contributions has shape (n_profiles, n_groups)
+    and get_proportion_successful_groups returns one proportion per profile.
+
+    With a profile_distribution (see lcp.ProfileDistribution), each player instead gets an LCP
+    profile of its own, drawn for its type when the population is sampled and stored as
+    float32 arrays in player_profiles (intercepts, slopes and first contributions).
+
+    The groups have group_size players, or, if group_size is an array of group sizes, mixed
+    sizes (see Population). Groups of other sizes than four are run by the object, numpy and
+    closed form backends, with the average profiles or a profile_distribution, and mixed sizes
+    by the object and numpy backends, with the profiles of a single profile. The threshold of
+    success is a group contribution, so to compare group sizes at the same share of the
+    maximum, query e.g. THRESHOLD * group_size / GROUP_SIZE.
+
+    With respond_to_self=True, each player responds to its own last contribution instead of the
+    other group members', as in the code originally published with the paper (see Group and
+    engine.run_groups_self_responding). This is supported by the object and numpy backends with
+    groups of one size and a single profile.
+
+    After a run, the proportion of successful groups can be queried for any threshold, or any
+    number of thresholds, and the whole survival curve (see get_survival_curve) without running
+    again: the final group contributions are sorted once, on the first query, and each
+    threshold is then a binary search.
     '''
-    def __init__(self, size, distribution):
-        self.population = Population(size, distribution)
+    def __init__(self, size, distribution, backend=NUMPY_BACKEND, exact=False, memoize=False, rng=None,
+                 stratified=False, treatment=None, profile=AVERAGE, profile_distribution=None,
+                 group_size=GROUP_SIZE, respond_to_self=False):
+        assert(backend in engine.get_backend_names(available=False))
+        if np.ndim(group_size) > 0 or group_size != GROUP_SIZE:
+            # The treatments, the group compositions and the numba loop assume groups of four
+            assert(backend in (OBJECT_BACKEND, NUMPY_BACKEND, CLOSED_FORM_BACKEND))
+            assert(not exact and not memoize and treatment is None)
+        if np.ndim(group_size) > 0:
+            assert(backend in (OBJECT_BACKEND, NUMPY_BACKEND))
+            assert(isinstance(profile, str) and profile_distribution is None)
+        if treatment is not None:
+            assert(backend == NUMPY_BACKEND and not exact and not memoize)
+        if backend == OBJECT_BACKEND:
+            # The Player classes use the average profiles
+            assert(profile == AVERAGE)
+        if not isinstance(profile, str):
+            assert(backend == NUMPY_BACKEND and not exact and not memoize and treatment is None)
+        if profile_distribution is not None:
+            assert(backend == NUMPY_BACKEND and not exact and not memoize and treatment is None)
+        if respond_to_self:
+            assert(backend in (OBJECT_BACKEND, NUMPY_BACKEND) and not exact and not memoize and treatment is None)
+            assert(isinstance(profile, str) and profile_distribution is None and np.ndim(group_size) == 0)
+        self.distribution = distribution
+        self.profile = profile
+        self.backend = backend
+        self.exact = exact
+        self.memoize = memoize
+        self.treatment = treatment
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
+        self.rng = rng
+        if exact:
+            self.population = None
+        else:
+            self.population = Population(size, distribution, rng, stratified, group_size, respond_to_self)
+        self.group_size = group_size
+        self.respond_to_self = respond_to_self
+        self.player_profiles = None
+        if profile_distribution is not None:
+            with instrument.phase("sample"):
+                self.player_profiles = profile_distribution.sample(self.population.get_types(), rng)
+
+        # Result
+        self.final_group_contributions = None
+        self.convergence_rounds = None
+        self.n_failed_checks = None
+        self.n_steps = None
+        self._sorted_group_contributions = None
+
+    def run(self, n_steps, tolerance=None, n_stable_steps=5, recorder=None, rematch_interval=None):
+        '''
+        Run the simulation for n_steps rounds. If tolerance is given, each group stops when it
+        has converged (see Group.run), and the round in which each group converged is stored
+        in convergence_rounds. If a recorder (a trajectory.TrajectoryRecorder) is given, the
+        contributions in the rounds it records are streamed to it.
+
+        By default the groups are fixed for all rounds (partner matching). With
+        rematch_interval, the players are instead reshuffled into new groups every
+        rematch_interval rounds (stranger matching, see engine.run_groups_rematched), and
+        final_group_contributions holds the contributions of the groups of the last round.
+        Rematching every round is about 13 times slower than fixed groups at 10^6 players (see
+        engine.run_groups_rematched).
+        '''
+        self.n_steps = n_steps
+        self._sorted_group_contributions = None
+        if recorder is not None:
+            assert(self.backend == NUMPY_BACKEND and not self.exact and not self.memoize)
+            assert(tolerance is None and isinstance(self.profile, str))
+        if tolerance is not None:
+            assert(not self.exact and not self.memoize)
+            assert(self.backend in (OBJECT_BACKEND, NUMPY_BACKEND))
+            assert(isinstance(self.profile, str))
+        if n_steps is None:
+            assert(self.backend == CLOSED_FORM_BACKEND and not self.exact and not self.memoize)
+        if self.player_profiles is not None:
+            assert(tolerance is None and recorder is None)
+        if self.respond_to_self:
+            assert(tolerance is None and recorder is None and rematch_interval is None)
+        if rematch_interval is not None:
+            assert(self.backend == NUMPY_BACKEND and not self.exact and not self.memoize and self.treatment is None)
+            assert(tolerance is None and recorder is None and isinstance(self.profile, str))
+        if np.ndim(self.group_size) > 0 or self.group_size != GROUP_SIZE:
+            assert(tolerance is None or self.backend == OBJECT_BACKEND)
+            assert(recorder is None and (rematch_interval is None or np.ndim(self.group_size) == 0))
+        cache_info = run_composition.cache_info() if instrument.is_enabled() else None
+        with instrument.phase("step"):
+            self._run(n_steps, tolerance, n_stable_steps, recorder, rematch_interval)
+        if cache_info is not None:
+            self._count(tolerance, cache_info)
+
+    def _run(self, n_steps, tolerance, n_stable_steps, recorder, rematch_interval):
+        coefficients = get_coefficient_table(self.profile)
+        if rematch_interval is not None:
+            if self.player_profiles is not None:
+                player_profiles, bound = self.player_profiles, engine.HETEROGENEOUS_BOUND
+            else:
+                player_profiles, bound = engine.get_player_coefficients(self.population.get_types(), coefficients), None
+            self.final_group_contributions = engine.run_groups_rematched(*player_profiles, n_steps, self.rng,
+                                                                         rematch_interval, bound)
+        elif self.player_profiles is not None:
+            self.final_group_contributions = engine.run_groups_heterogeneous(*self.player_profiles, n_steps)
+        elif self.treatment is not None:
+            assert(tolerance is None)
+            types = self.population.get_types()
+            self.final_group_contributions, self.n_failed_checks = engine.run_groups_with_checks(
+                types, coefficients, n_steps, get_check_probability(self.treatment),
+                get_threshold_range(self.treatment), self.rng, recorder=recorder)
+        elif self.exact:
+            self.final_group_contributions = get_composition_contributions(n_steps, self.profile)
+        elif self.memoize:
+            self.final_group_contributions = self.population.run_memoized(n_steps, coefficients)
+        elif self.backend == OBJECT_BACKEND:
+            for group in self.population.groups:
+                group.run(n_steps, tolerance, n_stable_steps)
+            self.final_group_contributions = np.array([group.final_group_contribution
+                                                       for group in self.population.groups])
+            if tolerance is not None:
+                self.convergence_rounds = np.array([group.convergence_round
+                                                    for group in self.population.groups])
+        elif self.respond_to_self:
+            self.final_group_contributions = engine.run_groups_self_responding(self.population.get_types(),
+                                                                               coefficients, n_steps)
+        elif self.population.offsets is not None:
+            self.final_group_contributions = engine.run_groups_ragged(self.population.get_types(),
+                                                                      self.population.offsets, coefficients, n_steps)
+        elif tolerance is not None:
+            types = self.population.get_types()
+            self.final_group_contributions, self.convergence_rounds = engine.run_groups_until_converged(
+                types, coefficients, n_steps, tolerance, n_stable_steps)
+        elif recorder is not None:
+            types = self.population.get_types()
+            self.final_group_contributions = engine.run_groups(types, coefficients, n_steps, recorder)
+        else:
+            types = self.population.get_types()
+            self.final_group_contributions = engine.get_backend(self.backend)(types, coefficients, n_steps)
+
+    def _count(self, tolerance, cache_info):
+        '''
+        Count the groups of the last run, the group-rounds that were executed and that were
+        skipped (computed directly, shared through the composition cache or not needed after
+        convergence), and the hits and misses of the composition cache (see run_composition).
+        '''
+        if self.exact:
+            n_groups = len(get_compositions())
+        else:
+            n_groups = self.population.n_groups * (1 if isinstance(self.profile, str) else len(self.profile))
+        instrument.count("groups", n_groups)
+        new_cache_info = run_composition.cache_info()
+        hits, misses = new_cache_info.hits - cache_info.hits, new_cache_info.misses - cache_info.misses
+        if hits + misses > 0:
+            instrument.count("composition_cache_hits", hits)
+            instrument.count("composition_cache_misses", misses)
+        if self.n_steps is None:
+            return
+        rounds = self.n_steps - 2
+        if self.exact or self.memoize:
+            executed = misses * rounds
+        elif self.backend == CLOSED_FORM_BACKEND:
+            executed = 0
+        elif tolerance is not None:
+            executed = int(np.where(self.convergence_rounds < 0, rounds, self.convergence_rounds - 1).sum())
+        else:
+            executed = n_groups * rounds
+        instrument.count("rounds_executed", executed)
+        instrument.count("rounds_skipped", n_groups * rounds - executed)
+
+    def get_sorted_group_contributions(self):
+        '''Return the final group contributions sorted along the last axis (computed once per run).'''
+        if self._sorted_group_contributions is None:
+            with instrument.phase("reduce"):
+                self._sorted_group_contributions = np.sort(self.final_group_contributions, axis=-1)
+        return self._sorted_group_contributions
+
+    def get_proportion_successful_groups(self, threshold=THRESHOLD):
+        '''
+        Return the proportion of groups whose final group contribution is at least threshold.
+        If threshold is an array of thresholds, e.g. THRESHOLDS, its shape is appended to the
+        shape of the result.
+        '''
+        if self.exact:
+            with instrument.phase("reduce"):
+                proportions = self.distribution.get_proportions()
+                p = get_expected_proportion_successful_groups(proportions, self.n_steps, self.profile, threshold)
+        else:
+            sorted_group_contributions = self.get_sorted_group_contributions()
+            with instrument.phase("reduce"):
+                p = get_proportion_successful_groups(sorted_group_contributions, threshold, is_sorted=True)
+        if np.ndim(p) == 0:
+            return float(p)
+        return p
+
+    def get_survival_curve(self):
+        '''
+        Return the distinct final group contributions in increasing order and the proportion of
+        groups whose final group contribution is at least each of them (see the function
+        get_survival_curve). With exact=True, the proportions are the expected ones.
+        '''
+        assert(isinstance(self.profile, str))
+        if self.exact:
+            return get_survival_curve(self.final_group_contributions,
+                                      self.distribution.get_composition_probabilities())
+        return get_survival_curve(self.get_sorted_group_contributions())
+
+
+class StreamingSimulation():
+    '''
+    A class representing a run of the agent-based simulation in which the population is never
+    held in memory. The groups are sampled, run and reduced chunk_size groups at a time, and
+    only running totals are kept: the number of successful groups, the sum and sum of squares
+    of the final group contributions, and a histogram of them with n_bins equal bins over
+    0-80, or 0 to 20 * group_size (and of the number of failed checks per group, with a
+    treatment). Peak memory thus depends on chunk_size and not on the population size.
+
+    Without a treatment, the groups are the same as those of a Simulation with the same rng
+    (that is not stratified), since the chunks draw the same random numbers in the same order.
+
+    The successful groups are counted for threshold, or for each of an array of thresholds
+    (e.g. THRESHOLDS). The survival curve (see get_survival_curve) is read from the histogram.
+    '''
+    def __init__(self, size, distribution, rng=None, chunk_size=STREAM_CHUNK_SIZE, treatment=None,
+                 profile=AVERAGE, n_bins=80, threshold=THRESHOLD, group_size=GROUP_SIZE):
+        assert(size % group_size == 0)
+        assert(isinstance(profile, str))
+        self.size = size
+        self.n_groups = size // group_size
+        self.group_size = group_size
+        self.distribution = distribution
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
+        self.rng = rng
+        self.chunk_size = chunk_size
+        self.treatment = treatment
+        self.profile = profile
+        self.bin_edges = np.linspace(0, 20 * group_size, n_bins + 1)
+        self.threshold = threshold
+
+        # Result
+        self.n_successful_groups = None
+        self.contribution_sum = None
+        self.contribution_sum_of_squares = None
+        self.histogram = None
+        self.failed_checks_histogram = None
+        self.n_steps = None
 
     def run(self, n_steps):
-        for group in self.population.groups:
-            group.run(n_steps)
+        self.n_steps = n_steps
+        coefficients = get_coefficient_table(self.profile)
+        n_bins = len(self.bin_edges) - 1
+        self.n_successful_groups = np.zeros(np.shape(self.threshold), dtype=np.int64)
+        self.contribution_sum = 0.0
+        self.contribution_sum_of_squares = 0.0
+        self.histogram = np.zeros(n_bins, dtype=np.int64)
+        self.failed_checks_histogram = np.zeros(1, dtype=np.int64) if self.treatment is not None else None
+        for start in range(0, self.n_groups, self.chunk_size):
+            n_chunk_groups = min(self.chunk_size, self.n_groups - start)
+            with instrument.phase("sample"):
+                types = self.distribution.sample_types(n_chunk_groups, self.rng, group_size=self.group_size)
+            with instrument.phase("step"):
+                if self.treatment is None:
+                    final_group_contributions = engine.run_groups(types, coefficients, n_steps)
+                else:
+                    final_group_contributions, n_failed_checks = engine.run_groups_with_checks(
+                        types, coefficients, n_steps, get_check_probability(self.treatment),
+                        get_threshold_range(self.treatment), self.rng)
+            with instrument.phase("reduce"):
+                self._add(final_group_contributions, n_bins)
+                if self.treatment is not None:
+                    counts = np.bincount(n_failed_checks)
+                    if len(counts) > len(self.failed_checks_histogram):
+                        self.failed_checks_histogram.resize(len(counts))
+                    self.failed_checks_histogram[:len(counts)] += counts
+            if instrument.is_enabled():
+                instrument.count("groups", n_chunk_groups)
+                instrument.count("rounds_executed", n_chunk_groups * (n_steps - 2))
+
+    def _add(self, final_group_contributions, n_bins):
+        assert(np.all(np.isfinite(final_group_contributions))), "Group contributions must all be finite."
+        sorted_group_contributions = np.sort(final_group_contributions)
+        self.n_successful_groups += len(final_group_contributions) - np.searchsorted(
+            sorted_group_contributions, self.threshold, side='left')
+        self.contribution_sum += float(final_group_contributions.sum())
+        self.contribution_sum_of_squares += float(np.dot(final_group_contributions, final_group_contributions))
+        # Equal bins, so the bin of a contribution is computed directly (the last bin includes 80)
+        bins = (final_group_contributions * (n_bins / self.bin_edges[-1])).astype(np.intp)
+        self.histogram += np.bincount(np.minimum(bins, n_bins - 1), minlength=n_bins)
 
     def get_proportion_successful_groups(self):
-        p = 0
-        for group in self.population.groups:
-            if group.final_group_contribution >= 60:
-                p += 1
-        p /= self.population.n_groups        
+        p = self.n_successful_groups / self.n_groups
+        if np.ndim(p) == 0:
+            return float(p)
         return p
 
+    def get_survival_curve(self):
+        '''
+        Return the lower bin edges of the histogram and the proportion of groups whose final
+        group contribution is at least each of them.
+        '''
+        return self.bin_edges[:-1], np.cumsum(self.histogram[::-1])[::-1] / self.n_groups
+
+    def get_mean_group_contribution(self):
+        return self.contribution_sum / self.n_groups
+
+    def get_std_group_contribution(self):
+        mean = self.get_mean_group_contribution()
+        return max(self.contribution_sum_of_squares / self.n_groups - mean**2, 0) ** 0.5
+
+
+def check_backends(n_configurations=20, seed=0, backends=None, max_size=2000, max_n_steps=300):
+    '''
+    Run n_configurations random configurations (distribution, population size and number of
+    rounds) with each of backends (all available backends if None) on the same population, and
+    assert that all give the same proportion of successful groups. Return a list with one
+    (uc, fr, size, n_steps, proportions) per configuration, where proportions maps each
+    backend to its proportion.
+    '''
+    if backends is None:
+        backends = engine.get_backend_names()
+    rng = np.random.default_rng(seed)
+    results = []
+    for _ in range(n_configurations):
+        low, high = sorted(rng.uniform(size=2))
+        uc, fr = float(low), float(high - low)
+        distribution = Distribution(uc, fr)
+        size = 4 * int(rng.integers(1, max_size // 4 + 1))
+        n_steps = int(rng.integers(3, max_n_steps + 1))
+        population_seed = int(rng.integers(2**63))
+        proportions = {}
+        for backend in backends:
+            simulation = Simulation(size, distribution, backend, rng=np.random.default_rng(population_seed))
+            simulation.run(n_steps)
+            proportions[backend] = simulation.get_proportion_successful_groups()
+        assert(len(set(proportions.values())) == 1), \
+            f"The backends disagree for uc={uc}, fr={fr}, size={size}, n_steps={n_steps}: {proportions}"
+        results.append((uc, fr, size, n_steps, proportions))
+    return results
+
+
+def run_replicates(size, distribution, n_steps, n_replicates, rng=None, stratified=False, profile=AVERAGE,
+                   threshold=THRESHOLD, group_size=GROUP_SIZE):
+    '''
+    Simulate n_replicates independent populations of the specified size and distribution in
+    one vectorized pass, and return the proportion of successful groups in each as an array.
+    If profile is a list of profiles, the result has shape (n_profiles, n_replicates). If
+    threshold is an array of thresholds, its shape is appended to the result's shape. The
+    groups have group_size players.
+    '''
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    assert(np.ndim(group_size) == 0)
+    populations = [Population(size, distribution, rng, stratified, group_size) for _ in range(n_replicates)]
+    types = np.stack([population.get_types() for population in populations])
+    with instrument.phase("step"):
+        final_group_contributions = engine.run_groups(types, get_coefficient_table(profile), n_steps)
+    if instrument.is_enabled():
+        n_groups = final_group_contributions.size
+        instrument.count("groups", n_groups)
+        instrument.count("rounds_executed", n_groups * (n_steps - 2))
+    with instrument.phase("reduce"):
+        return get_proportion_successful_groups(final_group_contributions, threshold)
+
+
+def summarize_replicates(ps, percentiles=(2.5, 97.5)):
+    '''
+    Return the mean, standard deviation and the specified percentiles of the proportions of
+    successful groups in replicate runs, given as an array with the replicates along the last
+    axis.
+    '''
+    ps = np.asarray(ps, dtype=float)
+    return {"mean": ps.mean(axis=-1),
+            "std": ps.std(axis=-1, ddof=1) if ps.shape[-1] > 1 else np.zeros(ps.shape[:-1]),
+            "percentiles": {q: np.percentile(ps, q, axis=-1) for q in percentiles}}
+
+
+def get_point_seeds(seed, n_points):
+    '''
+    Return one seed for each of n_points sweep points, derived from the master seed so that the
+    random number streams of the points are independent. Each seed is a list of four 32-bit
+    ints (128 bits, so that no two points of a sweep share a stream in practice), which
+    numpy.random.default_rng accepts and which can be part of a store key.
+    '''
+    children = np.random.SeedSequence(seed).spawn(n_points)
+    return [child.generate_state(4).tolist() for child in children]
+
+
+def _run_sweep_point(args):
+    uc, fr, seed, size, n_steps, n_replicates, thresholds, simulation_args = args
+    threshold = THRESHOLD if thresholds is None else np.asarray(thresholds)
+    if n_replicates is not None:
+        stratified = simulation_args.get("stratified", False)
+        profile = simulation_args.get("profile", AVERAGE)
+        group_size = simulation_args.get("group_size", GROUP_SIZE)
+        ps = run_replicates(size, Distribution(uc, fr), n_steps, n_replicates, np.random.default_rng(seed),
+                            stratified, profile, threshold, group_size)
+        return ps.tolist()
+    simulation = Simulation(size, Distribution(uc, fr), rng=np.random.default_rng(seed), **simulation_args)
+    simulation.run(n_steps)
+    return np.asarray(simulation.get_proportion_successful_groups(threshold)).tolist()
+
+
+def _map_tasks(function, tasks, max_workers):
+    '''
+    Yield the result of function for each task, in order, computed in max_workers processes
+    (all CPUs if None, in this process if 1). Tasks not yet started are cancelled if the
+    caller stops early or fails. If instrumentation is enabled, the phases and counters
+    recorded in the worker processes are added to the profiler of this process.
+    '''
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    if max_workers == 1 or len(tasks) <= 1:
+        yield from map(function, tasks)
+        return
+    chunksize = max(1, len(tasks) // (4 * max_workers))
+    executor = ProcessPoolExecutor(max_workers)
+    try:
+        profiler = instrument.get_profiler()
+        if profiler is None:
+            yield from executor.map(function, tasks, chunksize=chunksize)
+        else:
+            # Each worker records into a profiler of its own, whose report is merged here
+            tasks = [(function, task) for task in tasks]
+            for result, report in executor.map(instrument.run_instrumented, tasks, chunksize=chunksize):
+                profiler.merge(report)
+                yield result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def sweep(points, size=4000, n_steps=200, seed=0, max_workers=None, result_store=None,
+          n_replicates=None, thresholds=None, **simulation_args):
+    '''
+    Run one simulation for each (uc, fr) point in points and return the proportions of
+    successful groups as an array. The points are run in max_workers processes (all CPUs if
+    None, in this process if 1). Each point samples its population from its own random number
+    stream (see get_point_seeds), so the result only depends on seed and not on the number of
+    workers. Further keyword arguments are passed on to Simulation.
+
+    If result_store (a store.ResultStore) is given, points already in the store are not
+    simulated again, and each new point is written to the store as soon as it is done, so an
+    interrupted sweep resumes where it stopped.
+
+    If instrumentation is enabled (see instrument.py), and its profiler has a cprofile_point,
+    that point is run under cProfile in this process.
+
+    If n_replicates is given, each point simulates that many independent populations (see
+    run_replicates) and the result has shape (n_points, n_replicates). If the profile argument
+    of Simulation is a list of profiles, a dimension of length n_profiles is inserted after the
+    first.
+
+    If thresholds (a list of thresholds, e.g. THRESHOLDS) is given, the proportion of
+    successful groups is computed for each of them from the same runs (see
+    Simulation.get_proportion_successful_groups), which appends a dimension of length
+    len(thresholds) to the result.
+    '''
+    points = [(uc, fr) for uc, fr in points]
+    if thresholds is not None:
+        thresholds = np.asarray(thresholds).tolist()
+    seeds = get_point_seeds(seed, len(points))
+    ps = [None] * len(points)
+    keys = [None] * len(points)
+    if result_store is not None:
+        assert(seed is not None), "Results can only be stored for a fixed seed."
+        coefficients_hash = get_coefficients_hash()
+        # The thresholds are only part of the key when given, so that results stored for the
+        # default threshold remain valid
+        threshold_args = {} if thresholds is None else {"thresholds": thresholds}
+        # Array arguments, e.g. a group_size per group, are stored as lists in the key
+        key_args = {name: value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+                    for name, value in simulation_args.items()}
+        keys = [store.get_key(version=RESULTS_VERSION, uc=uc, fr=fr, size=size, n_steps=n_steps,
+                              seed=point_seed, n_replicates=n_replicates,
+                              coefficients=coefficients_hash, simulation_args=key_args, **threshold_args)
+                for (uc, fr), point_seed in zip(points, seeds)]
+        with instrument.phase("store"):
+            stored = result_store.get_many(keys)
+        ps = [stored.get(key) for key in keys]
+        instrument.count("store_hits", len(stored))
+        instrument.count("store_misses", len(points) - len(stored))
+
+    def _put(i, p):
+        ps[i] = p
+        if result_store is not None:
+            with instrument.phase("store"):
+                result_store.put(keys[i], p)
+
+    def _get_task(i):
+        return (points[i][0], points[i][1], seeds[i], size, n_steps, n_replicates, thresholds, simulation_args)
+
+    remaining = [i for i, p in enumerate(ps) if p is None]
+    instrument.count("sweep_points", len(remaining))
+    profiler = instrument.get_profiler()
+    if profiler is not None and profiler.cprofile_point in remaining:
+        i = profiler.cprofile_point
+        _put(i, instrument.run_cprofiled(_run_sweep_point, _get_task(i), profiler.cprofile_path))
+        remaining.remove(i)
+    tasks = [_get_task(i) for i in remaining]
+    for i, p in zip(remaining, _map_tasks(_run_sweep_point, tasks, max_workers)):
+        _put(i, p)
+    return np.array(ps, dtype=float)
+
+
+def _run_bootstrap_block(args):
+    ucs, coefficients, proportions, seeds, size, n_steps = args
+    types = []
+    for sample_proportions, seed in zip(proportions, seeds):
+        rng = np.random.default_rng(seed)
+        uc, cc, fr = sample_proportions
+        types.append([Population(size, Distribution(u, (1 - u) * fr / (cc + fr)), rng).get_types() for u in ucs])
+    with instrument.phase("step"):
+        final_group_contributions = engine.run_groups_paired(np.array(types), coefficients, n_steps)
+    if instrument.is_enabled():
+        instrument.count("groups", final_group_contributions.size)
+        instrument.count("rounds_executed", final_group_contributions.size * (n_steps - 2))
+    return get_proportion_successful_groups(final_group_contributions).tolist()
+
+
+def bootstrap_sweep(ucs, coefficients, proportions, size=4000, n_steps=200, seed=0, max_workers=None,
+                    block_size=16):
+    '''
+    Run the sweep of vary_only_uc once for each bootstrap sample of the coefficient tables and
+    type proportions (see lcp.bootstrap_coefficients), and return the proportions of successful
+    groups as an array of shape (n_samples, len(ucs)).
+
+    coefficients has shape (n_samples, len(PLAYER_TYPES), 3), one coefficient table per sample,
+    and proportions has shape (n_samples, len(PLAYER_TYPES)). For each sample, UC is varied
+    with CC/FR fixed to the ratio in the sample's proportions. The samples are run block_size
+    at a time, all points of a block in one pass of the engine (see engine.run_groups_paired),
+    with the blocks spread over max_workers processes as in sweep. Each sample draws its
+    populations from its own random number stream, so the result does not depend on
+    block_size or max_workers.
+    '''
+    coefficients = np.asarray(coefficients, dtype=float)
+    proportions = np.asarray(proportions, dtype=float)
+    assert(np.all(np.isfinite(coefficients))), "Bootstrap coefficients must all be finite."
+    assert(np.all(np.isfinite(proportions))), "Bootstrap proportions must all be finite."
+    n_samples = len(coefficients)
+    seeds = get_point_seeds(seed, n_samples)
+    tasks = [(list(ucs), coefficients[start:start + block_size], proportions[start:start + block_size],
+              seeds[start:start + block_size], size, n_steps)
+             for start in range(0, n_samples, block_size)]
+    ps = []
+    for block in _map_tasks(_run_bootstrap_block, tasks, max_workers):
+        ps.extend(block)
+    return np.array(ps, dtype=float)
+
+
+def compute_fr(uc):
+    '''Return the proportion of free-riders for the proportion uc of UC, with CC/FR constant.'''
+    # Empirically: UC:0.56, CC:0.358, FR:0.035, so CC/FR=10.2
+    fr = (1 - uc) / 11.2
+    cc = 10.2 * fr
+    assert(abs(uc + fr + cc - 1) < 0.0001), f"{uc + fr + cc} is not 1."
+    return fr
+
+
+def find_uc_crossing(target=0.5, tolerance=0.001, size=4000, n_steps=200, seed=0, **simulation_args):
+    '''
+    Return the proportion of UC (with CC/FR constant, see compute_fr) at which the proportion of
+    successful groups crosses target, found by bisection to within tolerance. Every evaluation
+    samples its population with the same seed (common random numbers) from an
+    OrderedDistribution, so that raising UC only turns players into more cooperative types, and
+    the proportion of successful groups is a monotone function of UC also in a stochastic
+    simulation. This does not hold with stratified=True, which permutes the players anew for
+    each UC. Further keyword arguments are passed on to Simulation, e.g. exact=True.
+    '''
+
+    def _get_p(uc):
+        distribution = OrderedDistribution(uc, compute_fr(uc))
+        simulation = Simulation(size, distribution, rng=np.random.default_rng(seed),
+                                **simulation_args)
+        simulation.run(n_steps)
+        return simulation.get_proportion_successful_groups()
+
+    low, high = 0, 1
+    assert(_get_p(low) < target <= _get_p(high)), f"The proportion of successful groups does not cross {target}."
+    while high - low > tolerance:
+        uc = (low + high) / 2
+        if _get_p(uc) < target:
+            low = uc
+        else:
+            high = uc
+    return (low + high) / 2
+
 
-def vary_only_uc():
+def get_only_uc_curve(seed=None, max_workers=None, result_store=None, n_replicates=None, profile=AVERAGE,
+                      n_bootstrap=None, respond_to_self=False):
+    '''
+    Vary the proportion of unconditional cooperators (UC) from 0 to 1 while keeping CC/FR
+    constant, run the simulation with this distribition and return the proportions of UC and
+    the proportions of successful groups, as an array of shape (n_ucs, n_profiles, n_values):
+    one value per point and profile, or one per replicate or bootstrap sample. See
+    vary_only_uc.
+    '''
+    RESOLUTION = 20
+    ucs = [i / RESOLUTION for i in range(RESOLUTION + 1)]
+    if n_bootstrap is None:
+        points = [(uc, compute_fr(uc)) for uc in ucs]
+        # respond_to_self is only passed on when set, so that the keys of stored results are unchanged
+        simulation_args = {"respond_to_self": True} if respond_to_self else {}
+        ps = sweep(points, 4000, 200, seed, max_workers, result_store, n_replicates, profile=profile,
+                   **simulation_args)
+    else:
+        assert(n_replicates is None and isinstance(profile, str) and not respond_to_self)
+        import lcp
+        matrices, proportions = lcp.bootstrap_coefficients(n_bootstrap, np.random.default_rng(seed),
+                                                           centered=True)
+        ps = bootstrap_sweep(ucs, matrices[:, PROFILES.index(profile)], proportions, 4000, 200, seed,
+                             max_workers).T
+    profiles = [profile] if isinstance(profile, str) else profile
+    return ucs, ps.reshape(len(ucs), len(profiles), -1)
+
+
+def get_pyplot(path=None):
+    '''
+    Return matplotlib.pyplot, which is only imported when a figure is made, so that runs without
+    figures do not pay for importing matplotlib. If the figure is to be saved to path rather
+    than shown, the non-interactive Agg backend is selected first, so that no display is needed.
+    '''
+    import matplotlib
+    if path is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def show_figure(plt, path=None):
+    '''Show the current figure, or save it to path if given.'''
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
+        plt.close()
+
+
+def plot_only_uc(ucs, ps, profiles, path=None):
+    '''
+    Plot the proportions of successful groups returned by get_only_uc_curve, one curve per
+    profile. With more than one value per point, the mean is plotted with a shaded band between
+    the 2.5 and 97.5 percentiles. The figure is shown, or saved to path if given.
+    '''
+    plt = get_pyplot(path)
+    with instrument.phase("plot"):
+        for i, p in enumerate(profiles):
+            if ps.shape[-1] == 1:
+                plt.plot(ucs, ps[:, i, 0], label=p)
+            else:
+                summary = summarize_replicates(ps[:, i])
+                lines = plt.plot(ucs, summary["mean"], label=p)
+                plt.fill_between(ucs, summary["percentiles"][2.5], summary["percentiles"][97.5],
+                                 color=lines[0].get_color(), alpha=0.3)
+        if len(profiles) > 1:
+            plt.legend()
+        plt.plot([0.56, 0.56], [0, 1], color='k')
+        plt.grid()
+        plt.xlabel("Proportion unconditional cooperators")
+        plt.ylabel("Proportion successful groups in population")
+    show_figure(plt, path)
+
+
+def vary_only_uc(seed=None, max_workers=None, result_store=None, n_replicates=None, profile=AVERAGE,
+                 n_bootstrap=None, path=None, respond_to_self=False):
     '''
     Vary the proportion of unconditional cooperators (UC) from 0 to 1 while keeping CC/FR
     constant, run the simulation with this distribition and plot the proportion of successful
-    groups in the population as a function of UC.
+    groups in the population as a function of UC. With a result_store (and a seed), stored
+    results are plotted without simulating again. With n_replicates, the mean over the
+    replicates is plotted with a shaded band between the 2.5 and 97.5 percentiles. If profile
+    is a list of profiles (e.g. PROFILES), one curve per profile is plotted from a single sweep.
+
+    With n_bootstrap, the participants in Data_Main.xlsx are resampled n_bootstrap times, the
+    coefficient tables and CC/FR are re-derived from each sample (see lcp.py), and the mean
+    over the samples is plotted with a shaded band between the 2.5 and 97.5 percentiles. The
+    samples are centred on the tables above (see lcp.bootstrap_coefficients with centered=True),
+    so that the band is around the curve of the published model.
+
+    With respond_to_self=True, the players respond to their own last contributions, as in the
+    code originally published with the paper (see Group), which reproduces the published
+    figure.
+
+    The figure is shown, or saved to path (e.g. a PNG file) if given.
     '''
+    ucs, ps = get_only_uc_curve(seed, max_workers, result_store, n_replicates, profile, n_bootstrap,
+                                respond_to_self)
+    plot_only_uc(ucs, ps, [profile] if isinstance(profile, str) else profile, path)
 
-    def _compute_fr(uc):
-        # Empirically: UC:0.56, CC:0.358, FR:0.035, so CC/FR=10.2
-        fr = (1 - uc) / 11.2
-        cc = 10.2 * fr
-        assert(abs(uc + fr + cc - 1) < 0.0001), f"{uc + fr + cc} is not 1."
-        return fr
 
-    RESOLUTION = 20
+def adaptive_sweep(levels, resolution=25, depth=2, max_difference=None, size=4000, n_steps=100, seed=0,
+                   max_workers=None, result_store=None, min_difference=None, **simulation_args):
+    '''
+    Compute the proportion of successful groups over UC and FR on a grid with
+    resolution * 2**depth intervals along each axis, simulating only where the contour levels
+    are. The grid cells of a coarse grid with resolution intervals are split into four, depth
+    times over, but only the cells whose (simulated) corners straddle one of levels, or, if
+    max_difference is given, differ by more than max_difference. If min_difference is given, a
+    cell whose corners differ by at most min_difference is not split even if it straddles a
+    level, since a difference within the sampling noise of the corners does not locate the
+    crossing. The points inside a cell that is not split are interpolated bilinearly from its
+    corners.
+
+    Return UC, FR and the proportions Z as arrays of shape (n, n) for n = resolution * 2**depth
+    + 1, as in vary_uc_fr (with 0 where UC + FR > 1), and the number of simulated points. The
+    simulated points of each refinement level are run with one call to sweep, and further
+    arguments are passed on to it.
+    '''
+    levels = np.asarray(levels, dtype=float)
+    n = resolution * 2**depth
+    values = {}  # (i, j) -> proportion at UC = i / n, FR = j / n
+
+    def _simulate(level, points):
+        points = sorted({(i, j) for i, j in points if i + j <= n and (i, j) not in values})
+        level_seed = None if seed is None else [seed, level]
+        ps = sweep([(i / n, j / n) for i, j in points], size, n_steps, level_seed, max_workers, result_store,
+                   **simulation_args)
+        values.update(zip(points, ps.tolist()))
+
+    def _get_corners(i, j, step):
+        return [(i, j), (i + step, j), (i, j + step), (i + step, j + step)]
+
+    def _get_corner_values(i, j, step):
+        # Corners outside UC + FR <= 1 take the mean of the others, so that they add no crossing
+        corners = [values.get(corner) for corner in _get_corners(i, j, step)]
+        valid = [v for v in corners if v is not None]
+        return [np.mean(valid) if v is None else v for v in corners]
+
+    def _is_split(i, j, step):
+        corner_values = _get_corner_values(i, j, step)
+        low, high = min(corner_values), max(corner_values)
+        if min_difference is not None and high - low <= min_difference:
+            return False
+        if max_difference is not None and high - low > max_difference:
+            return True
+        return bool(np.any((low < levels) & (levels <= high)))
+
+    # Cells as (i, j, step), with (i, j) the corner with the lowest UC and FR
+    step = 2**depth
+    cells = [(i, j, step) for i in range(0, n, step) for j in range(0, n - i, step)]
+    final_cells = []
+    for level in range(depth + 1):
+        _simulate(level, [corner for cell in cells for corner in _get_corners(*cell)])
+        if level == depth:
+            final_cells.extend(cells)
+            break
+        split = []
+        for cell in cells:
+            (split if _is_split(*cell) else final_cells).append(cell)
+        step //= 2
+        cells = [(i + di, j + dj, step) for i, j, _ in split for di in (0, step) for dj in (0, step)
+                 if i + di + j + dj < n]
+
+    Z = np.zeros((n + 1, n + 1))
+    for i, j, step in final_cells:
+        z00, z10, z01, z11 = _get_corner_values(i, j, step)
+        x = np.linspace(0, 1, step + 1)[:, np.newaxis]
+        y = np.linspace(0, 1, step + 1)[np.newaxis, :]
+        Z[i:i + step + 1, j:j + step + 1] = (z00 * (1 - x) * (1 - y) + z10 * x * (1 - y) + z01 * (1 - x) * y
+                                             + z11 * x * y)
+    for (i, j), p in values.items():
+        Z[i, j] = p
+    UC, FR = np.meshgrid(np.arange(n + 1) / n, np.arange(n + 1) / n, indexing='ij')
+    Z[UC + FR > 1] = 0
+    return UC, FR, Z, len(values)
+
+
+def get_uc_fr_grid(seed=None, max_workers=None, result_store=None, adaptive=False):
+    '''
+    Vary the proportions of unconditional cooperators (UC) and free-riders (FR) on a grid, run
+    the simulation with each distribution and return UC, FR and the proportions of successful
+    groups as arrays of the shape of the grid. Grid points with UC + FR > 1 are given the
+    proportion 0. See vary_uc_fr.
+    '''
+    if adaptive:
+        # The standard error of a point is up to 0.016 with 1000 groups, so corners that differ
+        # by at most 0.1 are left to the interpolation
+        UC, FR, Z, _ = adaptive_sweep(CONTOUR_LEVELS, 25, 2, size=4000, n_steps=100, seed=seed,
+                                      max_workers=max_workers, result_store=result_store, min_difference=0.1)
+        return UC, FR, Z
+    RESOLUTION = 100
     ucs = [i / RESOLUTION for i in range(RESOLUTION + 1)]
-    ps = []
-    for uc in ucs:
-        fr = _compute_fr(uc)
-        distribution = Distribution(uc, fr)
-        simulation = Simulation(4000, distribution)
-        simulation.run(200)
-        p = simulation.get_proportion_successful_groups()
-        ps.append(p)
-        # print(f"{uc},{fr} => {p}")
-    plt.plot(ucs, ps)
-    plt.plot([0.56, 0.56], [0, 1], color='k')
-    plt.grid()
-    plt.xlabel("Proportion unconditional cooperators")
-    plt.ylabel("Proportion successful groups in population")
-    plt.show()
+    frs = [i / RESOLUTION for i in range(RESOLUTION + 1)]
+    UC, FR = np.meshgrid(ucs, frs, indexing='ij')
+    valid = UC + FR <= 1
+
+    Z = np.zeros(UC.shape)
+    Z[valid] = sweep(zip(UC[valid], FR[valid]), 4000, 100, seed, max_workers, result_store)
+    return UC, FR, Z
+
+
+def plot_uc_fr(UC, FR, Z, path=None):
+    '''
+    Plot a contour of the proportions of successful groups returned by get_uc_fr_grid. The
+    figure is shown, or saved to path if given.
+    '''
+    plt = get_pyplot(path)
+    with instrument.phase("plot"):
+        fig = plt.figure()
+        ax = fig.add_subplot(1, 1, 1)
+        levels = CONTOUR_LEVELS
+        c = ax.contourf(UC, FR, Z, levels=levels, cmap=plt.get_cmap(name='jet', lut=1024))
+        cbar = plt.colorbar(c, ticks=levels)
+        cbar.set_ticklabels([str(x) for x in levels])
+        cbar.ax.tick_params(bottom=False, top=False, left=False, right=False, which='both')
+        plt.title("Proportion successful groups")
+        plt.xlabel("$UC$")
+        plt.ylabel("$FR$")
+    show_figure(plt, path)
+
+
+def vary_uc_fr(seed=None, max_workers=None, result_store=None, adaptive=False, path=None):
+    '''
+    Vary the proportions of unconditional cooperators (UC) and free-riders (FR) on a grid, run
+    the simulation with each distribution and plot a contour of the proportion of successful
+    groups in the population. Grid points with UC + FR > 1 are given the proportion 0.
+
+    With adaptive=True, the same 101 x 101 grid is computed from a grid with steps of 0.04,
+    refined twice only where the contour levels are (see adaptive_sweep). With seed 0 this
+    runs 587 simulations instead of 5151, about 9 times fewer, and the result differs from
+    that of an independently seeded uniform grid by 0.008 on average (0.010 between two
+    uniform grids), i.e. by less than the sampling noise. The figure is shown, or saved to
+    path if given.
+    '''
+    UC, FR, Z = get_uc_fr_grid(seed, max_workers, result_store, adaptive)
+    plot_uc_fr(UC, FR, Z, path)
+
+
+def get_threshold_uc_grid(seed=None, max_workers=None, result_store=None, thresholds=THRESHOLDS):
+    '''
+    Vary the proportion of unconditional cooperators (UC) from 0 to 1 while keeping CC/FR
+    constant, as in vary_only_uc, and return UC, the thresholds T and the proportions of
+    successful groups with each threshold, as arrays of shape (n_ucs, len(thresholds)). Each UC
+    is simulated once, and all thresholds are evaluated on the same run. See
+    vary_threshold_uc.
+    '''
+    RESOLUTION = 50
+    ucs = [i / RESOLUTION for i in range(RESOLUTION + 1)]
+    points = [(uc, compute_fr(uc)) for uc in ucs]
+    Z = sweep(points, 4000, 200, seed, max_workers, result_store, thresholds=thresholds)
+    UC, T = np.meshgrid(ucs, thresholds, indexing='ij')
+    return UC, T, Z
+
+
+def plot_threshold_uc(UC, T, Z, path=None):
+    '''
+    Plot a heatmap of the proportions of successful groups returned by get_threshold_uc_grid.
+    The figure is shown, or saved to path if given.
+    '''
+    plt = get_pyplot(path)
+    with instrument.phase("plot"):
+        fig = plt.figure()
+        ax = fig.add_subplot(1, 1, 1)
+        levels = CONTOUR_LEVELS
+        c = ax.contourf(UC, T, Z, levels=levels, cmap=plt.get_cmap(name='jet', lut=1024))
+        cbar = plt.colorbar(c, ticks=levels)
+        cbar.set_ticklabels([str(x) for x in levels])
+        ax.axhline(THRESHOLD, color='k', linestyle='--')
+        ax.axvline(0.56, color='k')
+        plt.title("Proportion successful groups")
+        plt.xlabel("Proportion unconditional cooperators")
+        plt.ylabel("Threshold")
+    show_figure(plt, path)
+
+
+def vary_threshold_uc(seed=None, max_workers=None, result_store=None, thresholds=THRESHOLDS, path=None):
+    '''
+    Vary the proportion of unconditional cooperators (UC) with CC/FR constant, as in
+    vary_only_uc, and plot a heatmap of the proportion of successful groups over UC and the
+    threshold of the group contribution (by default the range of the random threshold in
+    TREATMENT_LEVEL). The figure is shown, or saved to path if given.
+    '''
+    UC, T, Z = get_threshold_uc_grid(seed, max_workers, result_store, thresholds)
+    plot_threshold_uc(UC, T, Z, path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+'''
+Opt-in instrumentation of the simulation.
+
+When enabled (see enable), the phases of a run (sampling, creating groups, stepping,
+reduction, plotting, ...) record their wall time and number of calls, and counters record e.g.
+the number of groups run, the group-rounds executed and skipped, and the hits and misses of
+the caches. When disabled, phase returns a shared do-nothing context manager and count returns
+at once, and the callers only compute what they count under is_enabled(), so instrumentation
+costs nothing measurable.
+
+    profiler = instrument.enable()
+    fig6.sweep(points, max_workers=1)
+    instrument.disable()
+    print(profiler.format_report())
+'''
+import contextlib
+import cProfile
+import json
+import time
+
+
+class Profiler():
+    '''
+    A class representing the recorded phases and counters of one or more runs.
+
+    If cprofile_point is given, the sweep point with that index is run under cProfile (in this
+    process) and the statistics are dumped to cprofile_path, to be read with pstats.
+    '''
+
+    def __init__(self, cprofile_point=None, cprofile_path=None):
+        assert((cprofile_point is None) == (cprofile_path is None))
+        self.cprofile_point = cprofile_point
+        self.cprofile_path = cprofile_path
+        self.phases = {}  # Phase name -> [seconds, calls]
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            recorded = self.phases.setdefault(name, [0.0, 0])
+            recorded[0] += seconds
+            recorded[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, report):
+        '''Add the phases and counters of a report (see get_report), e.g. from a worker process.'''
+        for name, phase in report["phases"].items():
+            recorded = self.phases.setdefault(name, [0.0, 0])
+            recorded[0] += phase["seconds"]
+            recorded[1] += phase["calls"]
+        for name, n in report["counters"].items():
+            self.count(name, n)
+
+    def get_report(self):
+        '''
+        Return the recorded phases and counters, and the rates derived from them, as a JSON
+        serializable dict.
+        '''
+        phases = {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.phases.items()}
+        counters = dict(self.counters)
+        rates = {}
+        step_seconds = self.phases.get("step", [0.0, 0])[0]
+        if step_seconds > 0 and "groups" in counters:
+            rates["groups_per_second"] = counters["groups"] / step_seconds
+        for cache in ("composition_cache", "store"):
+            hits, misses = counters.get(cache + "_hits", 0), counters.get(cache + "_misses", 0)
+            if hits + misses > 0:
+                rates[cache + "_hit_rate"] = hits / (hits + misses)
+        executed, skipped = counters.get("rounds_executed", 0), counters.get("rounds_skipped", 0)
+        if executed + skipped > 0:
+            rates["rounds_skipped_fraction"] = skipped / (executed + skipped)
+        return {"phases": phases, "counters": counters, "rates": rates}
+
+    def write_report(self, path):
+        '''Write the report (see get_report) as JSON to path.'''
+        with open(path, 'w') as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def format_report(self):
+        '''Return the report as a compact text summary.'''
+        report = self.get_report()
+        total = sum(phase["seconds"] for phase in report["phases"].values())
+        lines = [f"{'phase':<16}{'seconds':>10}{'calls':>9}{'share':>8}"]
+        for name, phase in sorted(report["phases"].items(), key=lambda item: -item[1]["seconds"]):
+            share = phase["seconds"] / total if total > 0 else 0
+            lines.append(f"{name:<16}{phase['seconds']:>10.4f}{phase['calls']:>9}{share:>8.1%}")
+        for name, n in sorted(report["counters"].items()):
+            lines.append(f"{name:<25}{n:>15}")
+        for name, rate in sorted(report["rates"].items()):
+            lines.append(f"{name:<25}{rate:>15.4g}")
+        return "\n".join(lines)
+
+
+_profiler = None
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+def enable(profiler=None):
+    '''Start recording into profiler (a new Profiler if None) and return it.'''
+    global _profiler
+    if profiler is None:
+        profiler = Profiler()
+    _profiler = profiler
+    return profiler
+
+
+def disable():
+    '''Stop recording, and return the profiler that was recording (None if none was).'''
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def is_enabled():
+    return _profiler is not None
+
+
+def get_profiler():
+    return _profiler
+
+
+def phase(name):
+    '''Return a context manager that records the time spent in its body as the phase name.'''
+    if _profiler is None:
+        return _NULL_PHASE
+    return _profiler.phase(name)
+
+
+def count(name, n=1):
+    '''Add n to the counter name.'''
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+
+def run_instrumented(args):
+    '''
+    Run function(task) for args = (function, task) with a new profiler enabled, e.g. in a
+    worker process, and return the result and the profiler's report, to be merged into the
+    caller's profiler.
+    '''
+    function, task = args
+    previous = _profiler
+    profiler = enable()
+    try:
+        result = function(task)
+    finally:
+        if previous is None:
+            disable()
+        else:
+            enable(previous)
+    return result, profiler.get_report()
+
+
+def run_cprofiled(function, task, path):
+    '''Run function(task) under cProfile, dump the statistics to path and return the result.'''
+    cprofiler = cProfile.Profile()
+    result = cprofiler.runcall(function, task)
+    cprofiler.dump_stats(path)
+    return result
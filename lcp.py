@@ -0,0 +1,373 @@
+'''
+Regeneration of the LCP coefficient tables of the player types from the experiment data.
+
+Each participant's linear contribution profile (LCP) is the least-squares line of the
+participant's contribution in a round against the average contribution of the other group
+members in the previous round. All participants are fitted in one batched solve, classified
+into the player types, and the intercepts, slopes and first-round contributions are averaged
+per type and treatment into the tables YINTERCEPT, SLOPE and CONTR1 of the Player subclasses
+in fig6.py.
+
+The classification here (see classify) is NOT the one behind the tables in fig6.py, which is
+not part of this repository, so the regenerated tables are a different model. The data path
+is the same: e.g. the first-round contribution of the UC in Level (15.5375) is reproduced
+exactly. But the tables differ, e.g. the FR in 40P get intercept 6.41 and slope 0.072 (0.623
+and 0.333 in fig6.py), and the type proportions are 0.593/0.352/0.055 (0.56/0.358/0.035).
+The published averages imply per-treatment type counts that leave some participants
+unclassified (e.g. 38 UC, 96 CC and 9 FR of the 160 participants in Control), which no choice
+of CC_MIN_SLOPE and FR_MAX_CONTRIBUTION reproduces. compare_with_constants reports the
+differences. Results built on the regenerated tables (bootstrap_coefficients,
+ProfileDistribution) are therefore results of this regenerated model.
+'''
+import warnings
+
+import numpy as np
+
+import data
+import fig6
+from fig6 import (CONTROL, TREATMENT_10P, TREATMENT_40P, TREATMENT_LEVEL, TREATMENT_IMPACT, TREATMENTS,
+                  AVERAGED_TREATMENTS, AVERAGE, PROFILES, PLAYER_TYPES, UNCONDITIONAL_COOPERATOR,
+                  CONDITIONAL_COOPERATOR, FREE_RIDER, get_treatment_average)
+import engine
+
+
+# The treatment names in the data and in fig6.py
+DATA_TREATMENTS = {"Control": CONTROL, "10Prob": TREATMENT_10P, "40Prob": TREATMENT_40P,
+                   "40Level": TREATMENT_LEVEL, "40Impact": TREATMENT_IMPACT}
+
+# Default classification: a participant whose LCP slope is at least CC_MIN_SLOPE is a
+# conditional cooperator, otherwise a free-rider if the average contribution is below
+# FR_MAX_CONTRIBUTION, and otherwise an unconditional cooperator
+CC_MIN_SLOPE = 0.4
+FR_MAX_CONTRIBUTION = 10
+
+# The type proportions (in the order of fig6.PLAYER_TYPES) behind Figure 6 (see fig6.compute_fr)
+PUBLISHED_PROPORTIONS = [0.56, 0.358, 0.035]
+
+# The type code of a participant that is not classified (see classify)
+UNCLASSIFIED = -1
+
+
+def load_participants(sheet=data.SHEET_DIFF_TREATMENTS, path=data.DATA_FILE):
+    '''
+    Return the participants of a sheet of the experiment data as a dict with the treatment
+    (as named in fig6.py where there is such a name) and country of each participant, and the
+    arrays contributions and others_averages of shape (n_participants, n_rounds): the
+    participant's contribution and the average contribution of the other group members in
+    each round.
+
+    A participant is identified by country, treatment and player. Rows that repeat a
+    participant's round (e.g. player 03_04 in 100Prob of DiffProb, who appears twice in each
+    round) are not merged: the second occurrence of a round goes to a separate participant,
+    with "#2" appended to the player, and so on. A group-round with more rows than GROUP_SIZE
+    (e.g. a round 20 recorded as round 10) cannot be split into its groups, so its others'
+    averages are nan and are left out of the fits. Both are reported with a warning.
+    '''
+    columns = data.load_sheet(sheet, path=path)
+    countries = columns.get(data.COUNTRY, np.full(len(columns[data.PLAYER]), ""))
+    sessions = np.array([player.split('_')[0] for player in columns[data.PLAYER]])
+    rounds = columns[data.ROUND].astype(int)
+    contributions = columns[data.CONTRIBUTION].astype(float)
+
+    participant_keys = np.char.add(np.char.add(countries, "|" + columns[data.TREATMENT]),
+                                   np.char.add("|", columns[data.PLAYER]))
+    # The occurrence of each row among the rows with the same participant and round
+    pair_keys = np.char.add(participant_keys, "|" + rounds.astype(str))
+    order = np.argsort(pair_keys, kind='stable')
+    sorted_pair_keys = pair_keys[order]
+    is_first = np.concatenate([[True], sorted_pair_keys[1:] != sorted_pair_keys[:-1]])
+    positions = np.arange(len(order))
+    occurrences = np.empty(len(order), dtype=int)
+    occurrences[order] = positions - np.maximum.accumulate(np.where(is_first, positions, 0))
+    repeated = occurrences > 0
+    if repeated.any():
+        warnings.warn(f"{repeated.sum()} rows of {sheet} repeat a participant's round and are kept as separate "
+                      f"participants.")
+        participant_keys[repeated] = np.char.add(participant_keys[repeated],
+                                                 np.char.add("#", (occurrences[repeated] + 1).astype(str)))
+    participant_keys, participant_indices = np.unique(participant_keys, return_inverse=True)
+    # Group numbers are only unique within a session and round
+    group_keys = np.char.add(np.char.add(np.char.add(countries, "|" + columns[data.TREATMENT]), "|" + sessions),
+                             np.char.add("|" + columns[data.GROUP].astype(str), "|" + rounds.astype(str)))
+    _, group_indices = np.unique(group_keys, return_inverse=True)
+    group_sums = np.bincount(group_indices, weights=contributions)
+    group_sizes = np.bincount(group_indices)
+    others_averages = (group_sums[group_indices] - contributions) / (group_sizes[group_indices] - 1)
+    oversized = group_sizes[group_indices] > fig6.GROUP_SIZE
+    if oversized.any():
+        warnings.warn(f"{oversized.sum()} rows of {sheet} are in group-rounds of more than {fig6.GROUP_SIZE} rows "
+                      f"and are left out of the fits.")
+        others_averages[oversized] = np.nan
+
+    n_participants = len(participant_keys)
+    n_rounds = rounds.max()
+    participant_contributions = np.full((n_participants, n_rounds), np.nan)
+    participant_others_averages = np.full((n_participants, n_rounds), np.nan)
+    participant_contributions[participant_indices, rounds - 1] = contributions
+    participant_others_averages[participant_indices, rounds - 1] = others_averages
+
+    first = np.zeros(n_participants, dtype=int)
+    first[participant_indices] = np.arange(len(rounds))
+    treatments = [DATA_TREATMENTS.get(t, t) for t in columns[data.TREATMENT][first]]
+    return {"treatment": np.array(treatments), "country": countries[first],
+            "contributions": participant_contributions, "others_averages": participant_others_averages}
+
+
+def fit_lcp_profiles(contributions, others_averages):
+    '''
+    Return the intercepts and slopes of the LCP of each participant, fitting the contribution
+    in rounds 2, 3, ... against the others' average in the previous round. All participants
+    are fitted with one batched least-squares solve (the pseudo-inverse, so that a participant
+    whose group members always gave the same average gets the minimum-norm fit).
+
+    The pairs of rounds with a missing value (nan) are left out of a participant's fit. A
+    participant with fewer than two complete pairs gets nan coefficients.
+    '''
+    y = contributions[:, 1:]
+    x = others_averages[:, :-1]
+    # Leaving out a pair is the same as zeroing its row of the design matrix and its target
+    valid = np.isfinite(y) & np.isfinite(x)
+    X = np.stack([valid.astype(float), np.where(valid, x, 0)], axis=-1)
+    coefficients = np.einsum('nij,nj->ni', np.linalg.pinv(X), np.where(valid, y, 0))
+    coefficients[np.count_nonzero(valid, axis=1) < 2] = np.nan
+    return coefficients[:, 0], coefficients[:, 1]
+
+
+def classify(slopes, contributions, cc_min_slope=CC_MIN_SLOPE, fr_max_contribution=FR_MAX_CONTRIBUTION):
+    '''
+    Return the type code (see fig6.PLAYER_TYPES) of each participant, or UNCLASSIFIED for a
+    participant whose LCP could not be fitted (nan) or who has no first-round contribution.
+    The average contribution is taken over the rounds that are not missing.
+    '''
+    types = np.full(len(slopes), PLAYER_TYPES.index(UNCONDITIONAL_COOPERATOR), dtype=np.int8)
+    types[np.nanmean(contributions, axis=1) < fr_max_contribution] = PLAYER_TYPES.index(FREE_RIDER)
+    types[slopes >= cc_min_slope] = PLAYER_TYPES.index(CONDITIONAL_COOPERATOR)
+    types[~np.isfinite(slopes) | np.isnan(contributions[:, 0])] = UNCLASSIFIED
+    return types
+
+
+def get_coefficient_tables(participants, types, intercepts, slopes, treatments=TREATMENTS):
+    '''
+    Return the average intercept, slope and first-round contribution of the participants of
+    each type and treatment, as a dict from player type to a dict with the tables YINTERCEPT,
+    SLOPE and CONTR1, each a dict from treatment to value (nan if there are no participants).
+    '''
+    first_contributions = participants["contributions"][:, 0]
+    tables = {}
+    for code, player_type in enumerate(PLAYER_TYPES):
+        tables[player_type] = {"YINTERCEPT": {}, "SLOPE": {}, "CONTR1": {}}
+        for treatment in treatments:
+            selected = (types == code) & (participants["treatment"] == treatment)
+            for name, values in (("YINTERCEPT", intercepts), ("SLOPE", slopes), ("CONTR1", first_contributions)):
+                tables[player_type][name][treatment] = values[selected].mean() if selected.any() else np.nan
+    return tables
+
+
+def get_coefficient_matrix(tables):
+    '''
+    Return coefficient tables (see get_coefficient_tables) as an array in the layout of
+    fig6.get_coefficient_matrix, with the average profile taken as in the Player subclasses.
+    '''
+    matrix = np.zeros((len(PROFILES), len(PLAYER_TYPES), 3))
+    for j, player_type in enumerate(PLAYER_TYPES):
+        for column, name in ((engine.INTERCEPT, "YINTERCEPT"), (engine.SLOPE, "SLOPE"), (engine.CONTR1, "CONTR1")):
+            table = tables[player_type][name]
+            for i, treatment in enumerate(TREATMENTS):
+                matrix[i, j, column] = table[treatment]
+            matrix[PROFILES.index(AVERAGE), j, column] = get_treatment_average(table)
+    return matrix
+
+
+def get_type_proportions(participants, types, treatments):
+    '''Return the proportions of the player types among the classified participants in the treatments.'''
+    selected = np.isin(participants["treatment"], treatments) & (types != UNCLASSIFIED)
+    counts = np.bincount(types[selected], minlength=len(PLAYER_TYPES))
+    return counts / counts.sum()
+
+
+def fit_participants(sheet=data.SHEET_DIFF_TREATMENTS, path=data.DATA_FILE, cc_min_slope=CC_MIN_SLOPE,
+                     fr_max_contribution=FR_MAX_CONTRIBUTION):
+    '''
+    Load the participants of a sheet (see load_participants), fit their LCPs and classify
+    them, and return the participants, intercepts, slopes and type codes. Participants that
+    cannot be fitted are UNCLASSIFIED, and are left out of all tables and proportions.
+    '''
+    participants = load_participants(sheet, path)
+    intercepts, slopes = fit_lcp_profiles(participants["contributions"], participants["others_averages"])
+    types = classify(slopes, participants["contributions"], cc_min_slope, fr_max_contribution)
+    return participants, intercepts, slopes, types
+
+
+def run_pipeline(sheet=data.SHEET_DIFF_TREATMENTS, path=data.DATA_FILE, cc_min_slope=CC_MIN_SLOPE,
+                 fr_max_contribution=FR_MAX_CONTRIBUTION):
+    '''
+    Fit and classify all participants of a sheet and return the coefficient tables and the
+    type proportions over the averaged treatments (see fig6.AVERAGED_TREATMENTS).
+    '''
+    participants, intercepts, slopes, types = fit_participants(sheet, path, cc_min_slope, fr_max_contribution)
+    tables = get_coefficient_tables(participants, types, intercepts, slopes)
+    return tables, get_type_proportions(participants, types, AVERAGED_TREATMENTS)
+
+
+class ProfileDistribution():
+    '''
+    A class representing the distribution of the individual LCP profiles (intercept, slope and
+    first-round contribution) of each player type, to give each player a profile of its own
+    instead of the average profile of its type.
+
+    profiles is a list with an array of shape (n_participants, 3) for each type code, with the
+    columns engine.INTERCEPT, engine.SLOPE and engine.CONTR1. With fitted=False, a player's
+    profile is that of a participant of its type drawn at random (so intercept, slope and
+    first contribution keep their empirical joint distribution). With fitted=True, it is
+    drawn from a multivariate normal distribution with the mean and covariance of the
+    participants of its type.
+    '''
+
+    def __init__(self, profiles, fitted=False):
+        self.profiles = [np.asarray(p, dtype=float) for p in profiles]
+        self.fitted = fitted
+        self.means = [p.mean(axis=0) for p in self.profiles]
+        self.covariances = [np.cov(p, rowvar=False) if len(p) > 1 else np.zeros((3, 3)) for p in self.profiles]
+
+    def sample(self, types, rng, dtype=np.float32):
+        '''
+        Return the intercepts, slopes and first contributions of players with the specified type
+        codes, each as an array of the shape of types and the specified dtype, drawn using rng,
+        a numpy.random.Generator.
+        '''
+        types = np.asarray(types)
+        player_profiles = np.empty(types.shape + (3,), dtype=dtype)
+        for code, profiles in enumerate(self.profiles):
+            selected = types == code
+            n = np.count_nonzero(selected)
+            if n == 0:
+                continue
+            assert(len(profiles) > 0), f"There are no participants of type {PLAYER_TYPES[code]}."
+            if self.fitted:
+                player_profiles[selected] = rng.multivariate_normal(self.means[code], self.covariances[code], n)
+            else:
+                player_profiles[selected] = profiles[rng.integers(len(profiles), size=n)]
+        return (player_profiles[..., engine.INTERCEPT], player_profiles[..., engine.SLOPE],
+                player_profiles[..., engine.CONTR1])
+
+
+def get_profile_distribution(fitted=False, treatments=AVERAGED_TREATMENTS, sheet=data.SHEET_DIFF_TREATMENTS,
+                             path=data.DATA_FILE, cc_min_slope=CC_MIN_SLOPE, fr_max_contribution=FR_MAX_CONTRIBUTION):
+    '''
+    Return the ProfileDistribution of the fitted LCP profiles of the participants in the
+    specified treatments, classified into the player types as in run_pipeline.
+    '''
+    participants, intercepts, slopes, types = fit_participants(sheet, path, cc_min_slope, fr_max_contribution)
+    profiles = np.zeros((len(types), 3))
+    profiles[:, engine.INTERCEPT] = intercepts
+    profiles[:, engine.SLOPE] = slopes
+    profiles[:, engine.CONTR1] = participants["contributions"][:, 0]
+    selected = np.isin(participants["treatment"], treatments)
+    return ProfileDistribution([profiles[selected & (types == code)] for code in range(len(PLAYER_TYPES))], fitted)
+
+
+def bootstrap_coefficients(n_samples, rng, sheet=data.SHEET_DIFF_TREATMENTS, path=data.DATA_FILE,
+                           cc_min_slope=CC_MIN_SLOPE, fr_max_contribution=FR_MAX_CONTRIBUTION, centered=False):
+    '''
+    Resample the participants of a sheet n_samples times with replacement (within each
+    treatment, so that each treatment keeps its number of participants) and return the
+    coefficient matrix (see get_coefficient_matrix) and the type proportions over the averaged
+    treatments of each bootstrap sample, as arrays of shape (n_samples, len(PROFILES),
+    len(PLAYER_TYPES), 3) and (n_samples, len(PLAYER_TYPES)).
+
+    A participant's LCP fit and type do not depend on the other participants, so all
+    participants are fitted once, and the bootstrap samples only differ in how the
+    participants are weighted in the averages per type and treatment, which are computed for
+    all samples at once.
+
+    A rare type may be missing from a treatment in a sample. Its cell then takes the value of
+    the cell in the full data, so that all profiles are defined wherever the full data defines
+    them.
+
+    The samples are of the regenerated model, which differs from the tables in fig6.py (see the
+    module docstring). With centered=True, each sample is instead shifted by the difference of
+    the tables in fig6.py and PUBLISHED_PROPORTIONS from the full-data model, so that the
+    samples are centred on the published model (the proportions are then clipped at 0 and
+    renormalized).
+    '''
+    participants, intercepts, slopes, types = fit_participants(sheet, path, cc_min_slope, fr_max_contribution)
+    treatment_codes = np.array([TREATMENTS.index(t) if t in TREATMENTS else -1 for t in participants["treatment"]])
+
+    # Participant indices of the bootstrap samples, shape (n_samples, n_participants)
+    samples = []
+    for code in range(len(TREATMENTS)):
+        members = np.flatnonzero(treatment_codes == code)
+        samples.append(members[rng.integers(len(members), size=(n_samples, len(members)))])
+    samples = np.concatenate(samples, axis=1)
+
+    # Sum the coefficients of the sampled participants per (sample, treatment, type) cell. The
+    # unclassified participants are counted in a further type, which is then dropped.
+    n_types = len(PLAYER_TYPES) + 1
+    n_cells = len(TREATMENTS) * n_types
+    type_codes = np.where(types == UNCLASSIFIED, len(PLAYER_TYPES), types)
+    cells = treatment_codes[samples] * n_types + type_codes[samples]
+    cells = (cells + n_cells * np.arange(n_samples)[:, np.newaxis]).ravel()
+    shape = (n_samples, len(TREATMENTS), n_types)
+    counts = np.bincount(cells, minlength=n_samples * n_cells).reshape(shape)[..., :-1]
+    matrices = np.zeros((n_samples, len(PROFILES), len(PLAYER_TYPES), 3))
+    for column, values in ((engine.INTERCEPT, intercepts), (engine.SLOPE, slopes),
+                           (engine.CONTR1, participants["contributions"][:, 0])):
+        weights = np.where(types == UNCLASSIFIED, 0, values)[samples].ravel()
+        sums = np.bincount(cells, weights=weights, minlength=n_samples * n_cells).reshape(shape)[..., :-1]
+        with np.errstate(invalid='ignore'):
+            matrices[:, :len(TREATMENTS), :, column] = sums / counts
+    full_matrix = get_coefficient_matrix(get_coefficient_tables(participants, types, intercepts, slopes))
+    missing = counts == 0
+    matrices[:, :len(TREATMENTS)][missing] = np.broadcast_to(full_matrix[:len(TREATMENTS)], missing.shape + (3,))[missing]
+
+    averaged = [TREATMENTS.index(t) for t in AVERAGED_TREATMENTS]
+    type_counts = counts[:, averaged].sum(axis=1)
+    proportions = type_counts / type_counts.sum(axis=1, keepdims=True)
+    if centered:
+        matrices[:, :len(TREATMENTS)] += (fig6.get_coefficient_matrix() - full_matrix)[:len(TREATMENTS)]
+        full_proportions = get_type_proportions(participants, types, AVERAGED_TREATMENTS)
+        proportions = np.clip(proportions + (np.array(PUBLISHED_PROPORTIONS) - full_proportions), 0, None)
+        proportions /= proportions.sum(axis=1, keepdims=True)
+
+    # A treatment that is not in the sheet at all (nan) is left out of the average
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        matrices[:, PROFILES.index(AVERAGE)] = np.nanmean(matrices[:, averaged], axis=1)
+    return matrices, proportions
+
+
+def compare_with_constants(tables, proportions):
+    '''
+    Return the differences of regenerated coefficient tables and type proportions (see
+    run_pipeline) from the tables of the Player subclasses in fig6.py and
+    PUBLISHED_PROPORTIONS: an array of shape (len(TREATMENTS), len(PLAYER_TYPES), 3) in the
+    layout of get_coefficient_matrix, and an array of length len(PLAYER_TYPES), each the
+    regenerated minus the published value.
+    '''
+    n_treatments = len(TREATMENTS)
+    differences = get_coefficient_matrix(tables)[:n_treatments] - fig6.get_coefficient_matrix()[:n_treatments]
+    return differences, np.asarray(proportions) - PUBLISHED_PROPORTIONS
+
+
+def format_tables(tables):
+    '''Return the coefficient tables as the class attributes of the Player subclasses in fig6.py.'''
+    treatment_constants = {CONTROL: "CONTROL", TREATMENT_10P: "TREATMENT_10P", TREATMENT_40P: "TREATMENT_40P",
+                           TREATMENT_LEVEL: "TREATMENT_LEVEL", TREATMENT_IMPACT: "TREATMENT_IMPACT"}
+    lines = []
+    for player_type in PLAYER_TYPES:
+        lines.append(f"# {player_type}")
+        for name in ("YINTERCEPT", "SLOPE", "CONTR1"):
+            values = ", ".join(f"{treatment_constants[t]}: {v:.9g}" for t, v in tables[player_type][name].items())
+            lines.append(f"{name} = {{{values}}}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    tables, proportions = run_pipeline()
+    print(format_tables(tables))
+    print("# Proportions " + ", ".join(f"{t}: {p:.3f}" for t, p in zip(PLAYER_TYPES, proportions)))
+    differences, proportion_differences = compare_with_constants(tables, proportions)
+    print("# Largest difference from the tables in fig6.py: " + ", ".join(
+        f"{t}: {np.nanmax(np.abs(differences[:, j])):.3g}" for j, t in enumerate(PLAYER_TYPES)))
+    print("# Difference from the published proportions: " + ", ".join(
+        f"{t}: {d:+.3f}" for t, d in zip(PLAYER_TYPES, proportion_differences)))
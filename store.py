@@ -0,0 +1,58 @@
+'''
+Persistent on-disk store of simulation results.
+
+Results are stored in an SQLite database under a key that is a hash of everything that
+determines the result (distribution, population size, number of rounds, seed, coefficients, ...),
+so a result computed once is never recomputed, and an interrupted sweep resumes where it stopped.
+'''
+import hashlib
+import json
+import sqlite3
+
+
+def get_key(**params):
+    '''Return the key of the result determined by the specified parameters, which must be JSON serializable.'''
+    s = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+class ResultStore():
+    '''
+    A class representing a store of results in an SQLite database file. The values are stored
+    as JSON.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    def get(self, key):
+        '''Return the value stored under key, or None if there is none.'''
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        '''Return a dict with the stored values of those of the specified keys that have one.'''
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def put(self, key, value):
+        '''Store value under key and commit it to disk immediately.'''
+        self.connection.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+                                (key, json.dumps(value)))
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
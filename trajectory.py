@@ -0,0 +1,85 @@
+'''
+Recording of the contributions in each round of a simulation to memory-mapped files.
+
+The engine runs the groups in chunks (see engine.CHUNK_SIZE), and a TrajectoryRecorder writes
+the rounds of each chunk to a memory-mapped .npy file as soon as the chunk is done, so that the
+trajectories of millions of groups can be kept on disk with a bounded memory footprint. A JSON
+file next to the .npy file holds what is needed to interpret it (see load_trajectories).
+'''
+import json
+
+import numpy as np
+
+
+# The largest possible contribution of a player, used to scale contributions stored as uint8
+MAX_CONTRIBUTION = 20
+
+
+class TrajectoryRecorder():
+    '''
+    A class representing a recording of the group contributions (or, with per_player=True, the
+    player contributions) of n_groups groups in every stride:th round of a run of n_steps
+    rounds, starting with the first round.
+
+    The trajectories are stored with shape (n_groups, n_recorded_rounds), or
+    (n_groups, n_recorded_rounds, 4) per player, with dtype float64, float32, float16 or uint8.
+    With uint8, the contributions are scaled so that the largest possible contribution is 255.
+    '''
+
+    def __init__(self, path, n_groups, n_steps, stride=1, per_player=False, dtype=np.float16):
+        dtype = np.dtype(dtype)
+        assert(dtype in (np.float64, np.float32, np.float16, np.uint8))
+        self.path = path
+        self.n_groups = n_groups
+        self.per_player = per_player
+        self.dtype = dtype
+        self.rounds = list(range(1, n_steps, stride))
+        self._round_indices = {r: i for i, r in enumerate(self.rounds)}
+        if dtype == np.uint8:
+            max_value = MAX_CONTRIBUTION if per_player else 4 * MAX_CONTRIBUTION
+            self.scale = 255 / max_value
+        else:
+            self.scale = 1
+
+        shape = (n_groups, len(self.rounds)) + ((4,) if per_player else ())
+        self.trajectories = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+        metadata = {"rounds": self.rounds, "per_player": per_player, "scale": self.scale}
+        with open(path + ".json", 'w') as f:
+            json.dump(metadata, f)
+
+    def new_buffer(self, n_groups):
+        '''Return a buffer for the recorded rounds of a chunk of n_groups groups.'''
+        return np.zeros((n_groups,) + self.trajectories.shape[1:], dtype=self.dtype)
+
+    def add(self, buffer, r, contributions):
+        '''
+        Add the (clamped) contributions of round r, an array of shape (n_groups, 4), of the
+        groups of a chunk to its buffer, if round r is recorded.
+        '''
+        i = self._round_indices.get(r)
+        if i is None:
+            return
+        values = contributions if self.per_player else contributions.sum(axis=1)
+        if self.dtype == np.uint8:
+            values = np.rint(values * self.scale)
+        buffer[:, i] = values
+
+    def write(self, start, buffer):
+        '''Write the buffer of the chunk of groups starting with group start to the file.'''
+        self.trajectories[start:start + len(buffer)] = buffer
+
+    def close(self):
+        self.trajectories.flush()
+        del self.trajectories
+
+
+def load_trajectories(path):
+    '''
+    Return the trajectories recorded to path as a read-only memory-mapped array, the recorded
+    rounds, and the scale of the stored values, so that the contributions are the stored
+    values divided by the scale.
+    '''
+    with open(path + ".json") as f:
+        metadata = json.load(f)
+    trajectories = np.load(path, mmap_mode='r')
+    return trajectories, metadata["rounds"], metadata["scale"]